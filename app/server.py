@@ -1,7 +1,14 @@
 from apigateway import APIGateway, Service
 from apigateway.Authentication import JWTEncoder
+from apigateway.Cache import ResponseCache, CacheRule, TTLCache
+from apigateway.Routes import load_routes, DEFAULT_ROUTES
+from apigateway.Resilience import CircuitBreaker, RetryPolicy, RetryBudget
+from apigateway.Balancer import Balancer
+from apigateway.Concurrency import ConcurrencyLimit
+from apigateway.Jobs import MemoryJobStore
 from fastapi import FastAPI
 from dotenv import dotenv_values
+import httpx
 import os
 
 
@@ -20,6 +27,125 @@ cfg["INVENTORY_SERVICE"] = os.environ.get("INVENTORY_SERVICE", cfg.get("INVENTOR
 cfg["EXPIRE"] = os.environ.get("EXPIRE", cfg.get("EXPIRE", None))
 cfg["JWT_SECRET"] = os.environ.get("JWT_SECRET", cfg.get("JWT_SECRET", None))
 cfg["JWT_ALG"] = os.environ.get("JWT_ALG", cfg.get("JWT_ALG", None))
+cfg["JWT_BACKEND"] = os.environ.get("JWT_BACKEND", cfg.get("JWT_BACKEND", None))
+cfg["JWT_CACHE_SIZE"] = os.environ.get("JWT_CACHE_SIZE", cfg.get("JWT_CACHE_SIZE", None))
+cfg["ADMIN_TOKEN"] = os.environ.get("ADMIN_TOKEN", cfg.get("ADMIN_TOKEN", None))
+cfg["METRICS"] = os.environ.get("METRICS", cfg.get("METRICS", None))
+cfg["SERVER_TIMING"] = os.environ.get("SERVER_TIMING", cfg.get("SERVER_TIMING", None))
+cfg["BATCH_CONCURRENCY"] = os.environ.get("BATCH_CONCURRENCY", cfg.get("BATCH_CONCURRENCY", None))
+cfg["BATCH_MAX_REQUESTS"] = os.environ.get("BATCH_MAX_REQUESTS", cfg.get("BATCH_MAX_REQUESTS", None))
+cfg["JOB_WORKERS"] = os.environ.get("JOB_WORKERS", cfg.get("JOB_WORKERS", None))
+cfg["JOB_QUEUE"] = os.environ.get("JOB_QUEUE", cfg.get("JOB_QUEUE", None))
+cfg["RATE_LIMIT"] = os.environ.get("RATE_LIMIT", cfg.get("RATE_LIMIT", None))
+cfg["RATE_LIMIT_ALGORITHM"] = os.environ.get("RATE_LIMIT_ALGORITHM", cfg.get("RATE_LIMIT_ALGORITHM", None))
+# per-route quotas, e.g. RATE_LIMIT_GET_FOODS=100/1 or RATE_LIMIT_GET_FOODS=off
+cfg.update({k: v for k, v in os.environ.items() if k.startswith("RATE_LIMIT_")})
+cfg["COMPRESSION"] = os.environ.get("COMPRESSION", cfg.get("COMPRESSION", None))
+cfg["COMPRESSION_MIN_SIZE"] = os.environ.get("COMPRESSION_MIN_SIZE", cfg.get("COMPRESSION_MIN_SIZE", None))
+cfg["COMPRESSION_GZIP_LEVEL"] = os.environ.get("COMPRESSION_GZIP_LEVEL", cfg.get("COMPRESSION_GZIP_LEVEL", None))
+cfg["COMPRESSION_BR_LEVEL"] = os.environ.get("COMPRESSION_BR_LEVEL", cfg.get("COMPRESSION_BR_LEVEL", None))
+cfg["COMPRESSION_ZSTD_LEVEL"] = os.environ.get("COMPRESSION_ZSTD_LEVEL", cfg.get("COMPRESSION_ZSTD_LEVEL", None))
+cfg["CONDITIONAL"] = os.environ.get("CONDITIONAL", cfg.get("CONDITIONAL", None))
+cfg["ETAG_MAX_SIZE"] = os.environ.get("ETAG_MAX_SIZE", cfg.get("ETAG_MAX_SIZE", None))
+cfg["ROUTES"] = os.environ.get("ROUTES", cfg.get("ROUTES", DEFAULT_ROUTES))
+
+def setting(name: str | None, key: str, default=None):
+    # per-service override, e.g. MEALPLAN_SERVICE_POOL_MAX_CONNECTIONS, falls back to POOL_MAX_CONNECTIONS
+    for k in (f"{name}_SERVICE_{key}", key) if name else (key,):
+        value = os.environ.get(k, cfg.get(k, None))
+        if value is not None:
+            return value
+    return default
+
+# read-only catalog routes, TTL and stale-while-revalidate window in seconds
+cache_rules = {
+    "FOOD": [
+        CacheRule(r"/api/foods/discounted$", ttl=300, stale=600),
+        CacheRule(r"/api/foods/\d+$", ttl=3600, stale=3600),
+        CacheRule(r"/api/foods\?", ttl=600, stale=600),
+    ],
+    "RECIPE": [
+        CacheRule(r"/recipe/\d+$", ttl=3600, stale=3600),
+    ],
+}
+
+# shared by every service so that retries can never multiply the load on the backends by more than the ratio
+retry_budget = RetryBudget(
+    ratio=float(setting(None, "RETRY_BUDGET_RATIO", 0.2)),
+    min_per_sec=float(setting(None, "RETRY_BUDGET_MIN_PER_SEC", 10)),
+)
+
+def service(name: str) -> Service:
+    cache = None
+    if name in cache_rules and setting(name, "CACHE", "true").lower() == "true":
+        cache = ResponseCache(
+            cache_rules[name],
+            max_entries=int(setting(name, "CACHE_MAX_ENTRIES", 1024)),
+            max_bytes=int(setting(name, "CACHE_MAX_BYTES", 16 * 1024 * 1024)),
+        )
+    # replicas of a service are given as a comma separated list, e.g. FOOD_SERVICE=http://food-1:80,http://food-2:80
+    endpoints = [dest.strip() for dest in cfg[f"{name}_SERVICE"].split(",")]
+    validators = None
+    if setting(name, "REVALIDATE", "true").lower() == "true":
+        validators = TTLCache(
+            int(setting(name, "REVALIDATE_MAX_ENTRIES", 1024)),
+            max_bytes=int(setting(name, "REVALIDATE_MAX_BYTES", 16 * 1024 * 1024)),
+        )
+    concurrency = None
+    if setting(name, "CONCURRENCY_LIMIT", "gradient") != "off":
+        concurrency = ConcurrencyLimit(
+            name.lower(),
+            algorithm=setting(name, "CONCURRENCY_LIMIT", "gradient"),
+            initial=int(setting(name, "CONCURRENCY_INITIAL", 20)),
+            min_limit=int(setting(name, "CONCURRENCY_MIN", 2)),
+            max_limit=int(setting(name, "CONCURRENCY_MAX", 200)),
+            queue_size=int(setting(name, "CONCURRENCY_QUEUE", 100)),
+            max_wait=float(setting(name, "CONCURRENCY_MAX_WAIT", 1)),
+        )
+    total_timeout = setting(name, "TIMEOUT_TOTAL")
+    max_per_host = setting(name, "POOL_MAX_PER_HOST")
+    return Service(
+        endpoints,
+        limits=httpx.Limits(
+            max_connections=int(setting(name, "POOL_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(setting(name, "POOL_MAX_KEEPALIVE", 20)),
+            keepalive_expiry=float(setting(name, "POOL_KEEPALIVE_EXPIRY", 30)),
+        ),
+        max_per_host=int(max_per_host) if max_per_host is not None else None,
+        http2=setting(name, "HTTP2", "false").lower() == "true",
+        cache=cache,
+        timeout=httpx.Timeout(
+            float(setting(name, "TIMEOUT_READ", 30)),
+            connect=float(setting(name, "TIMEOUT_CONNECT", 5)),
+        ),
+        total_timeout=float(total_timeout) if total_timeout is not None else None,
+        retry=RetryPolicy(
+            attempts=int(setting(name, "RETRY_ATTEMPTS", 3)),
+            backoff=float(setting(name, "RETRY_BACKOFF", 0.05)),
+            backoff_max=float(setting(name, "RETRY_BACKOFF_MAX", 1)),
+            budget=retry_budget,
+        ),
+        breaker=CircuitBreaker(
+            name.lower(),
+            failure_threshold=int(setting(name, "BREAKER_FAILURES", 5)),
+            recovery_time=float(setting(name, "BREAKER_RECOVERY", 30)),
+            half_open_max=int(setting(name, "BREAKER_HALF_OPEN", 1)),
+        ),
+        name=name.lower(),
+        coalesce=setting(name, "COALESCE", "true").lower() == "true",
+        trusted=setting(name, "TRUSTED", "false").lower() == "true",
+        validators=validators,
+        concurrency=concurrency,
+        balancer=Balancer(
+            strategy=setting(name, "LB_STRATEGY", "p2c"),
+            health_path=setting(name, "LB_HEALTH_PATH"),
+            health_interval=float(setting(name, "LB_HEALTH_INTERVAL", 10)),
+            health_timeout=float(setting(name, "LB_HEALTH_TIMEOUT", 2)),
+            eject_failures=int(setting(name, "LB_EJECT_FAILURES", 5)),
+            eject_time=float(setting(name, "LB_EJECT_TIME", 30)),
+            slow_start=float(setting(name, "LB_SLOW_START", 30)),
+        ) if len(endpoints) > 1 else None,
+    )
 
 tags_metadata = [
     {"name": "users", "description": "Operations with users"},
@@ -34,13 +160,17 @@ tags_metadata = [
 app = FastAPI(title="APIGateway", openapi_tags=tags_metadata, version="0.1.0")
 
 gateway = APIGateway(app, cfg, JWTEncoder(cfg), {
-    "user": Service(cfg["USER_SERVICE"]),
-    "health": Service(cfg["HEALTH_SERVICE"]),
-    "food": Service(cfg["FOOD_SERVICE"]),
-    "inventory": Service(cfg["INVENTORY_SERVICE"]),
-    "mealplan": Service(cfg["MEALPLAN_SERVICE"]),
-    "recipe": Service(cfg["RECIPE_SERVICE"])
+    "user": service("USER"),
+    "health": service("HEALTH"),
+    "food": service("FOOD"),
+    "inventory": service("INVENTORY"),
+    "mealplan": service("MEALPLAN"),
+    "recipe": service("RECIPE")
     },
-    [cfg['CLIENT']]
+    [cfg['CLIENT']],
+    job_store=MemoryJobStore(
+        max_jobs=int(setting(None, "JOB_MAX_STORED", 10000)),
+        ttl=float(setting(None, "JOB_TTL", 3600)),
+    ),
     )
-gateway.configure_routes()
+gateway.configure_routes(load_routes(cfg["ROUTES"]))
@@ -0,0 +1,34 @@
+# Compares the cached and uncached JWTEncoder.decode_token paths for every available backend.
+#   python benchmarks/auth_bench.py [--number 20000]
+from datetime import timedelta
+import argparse
+import timeit
+
+from apigateway.Authentication import JWTEncoder, backends
+
+
+def bench(backend: str, cache_size: int, number: int) -> float:
+    encoder = JWTEncoder({"JWT_SECRET": "benchmark", "JWT_ALG": "HS256", "JWT_BACKEND": backend, "JWT_CACHE_SIZE": str(cache_size)})
+    token = encoder.encode("bench", 1, timedelta(days=1))
+    assert encoder.decode_token(token) is not None
+    return timeit.timeit(lambda: encoder.decode_token(token), number=number) / number
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'uncached':>12} {'cached':>12} {'speedup':>8}")
+    for backend in backends:
+        try:
+            uncached = bench(backend, 0, args.number)
+            cached = bench(backend, 10000, args.number)
+        except ImportError as e:
+            print(f"{backend:<8} skipped: {e}")
+            continue
+        print(f"{backend:<8} {uncached * 1e6:>10.2f}us {cached * 1e6:>10.2f}us {uncached / cached:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
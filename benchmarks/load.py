@@ -0,0 +1,198 @@
+# Drives the real app.server app against stub backends at fixed concurrency levels.
+#   python benchmarks/load.py --concurrency 1,16,64 --duration 10 --latency 0.005 --items 100
+#   python benchmarks/load.py --save main        store the results in benchmarks/baselines/main.json
+#   python benchmarks/load.py --compare main     print the change against a stored baseline
+#
+# The stub backends run in a separate process so that their CPU time is not counted; the load
+# generator does run in the gateway process and is included in the CPU time per request.
+from multiprocessing import Process
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(ROOT, "benchmarks", "baselines")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from stubs import SERVICES, free_port, serve  # noqa: E402
+
+ROUTES = [
+    "/user",
+    "/health/history",
+    "/foods?query=milk",
+    "/foods/7",
+    "/recipe/3",
+    "/inventories",
+    "/mealPlan/all",
+]
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def run_level(client: httpx.AsyncClient, headers: dict, routes: list[str], concurrency: int, duration: float) -> dict:
+    # only 2xx responses count towards throughput and latency, a fast 429 or 503 is not a served request
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset: int):
+        nonlocal errors
+        i = offset
+        while time.perf_counter() < deadline:
+            route = routes[i % len(routes)]
+            i += 1
+            start = time.perf_counter()
+            res = await client.get(route, headers=headers)
+            if res.is_success:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / wall,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "cpu_us_per_request": cpu / max(1, len(latencies) + errors) * 1e6,
+        "rss_mb": rss() / 1024 / 1024,
+    }
+
+
+async def bench(args) -> list[dict]:
+    from app.server import app
+
+    routes = args.routes.split(",") if args.routes else ROUTES
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway", timeout=60) as client:
+            res = await client.post("/login", data={"username": "bench", "password": "bench"})
+            res.raise_for_status()
+            headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+            await run_level(client, headers, routes, 4, min(1.0, args.duration))  # warm up
+            results = []
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                result = await run_level(client, headers, routes, concurrency, args.duration)
+                results.append(result)
+                print_row(result)
+            return results
+    finally:
+        await app.router.shutdown()
+
+
+COLUMNS = ["concurrency", "requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "cpu_us_per_request", "rss_mb"]
+
+def print_header():
+    print(" ".join(f"{c:>18}" for c in COLUMNS))
+
+def print_row(result: dict):
+    print(" ".join(f"{result[c]:>18.2f}" if isinstance(result[c], float) else f"{result[c]:>18}" for c in COLUMNS))
+
+
+def change(result: dict, baseline: dict, key: str) -> float:
+    return (result[key] - baseline[key]) / baseline[key] * 100 if baseline[key] else 0.0
+
+
+def compare(results: list[dict], name: str):
+    with open(os.path.join(BASELINES, f"{name}.json")) as f:
+        baseline = json.load(f)
+    print(f"\nchange against {name} ({baseline['commit']}):")
+    print(f"{'concurrency':>18} {'rps':>10} {'p99_ms':>10} {'cpu/request':>12}")
+    old = {r["concurrency"]: r for r in baseline["results"]}
+    for r in results:
+        b = old.get(r["concurrency"])
+        if b is None:
+            continue
+        print(f"{r['concurrency']:>18} {change(r, b, 'rps'):>+9.1f}% {change(r, b, 'p99_ms'):>+9.1f}% {change(r, b, 'cpu_us_per_request'):>+11.1f}%")
+
+
+def commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", default="1,16,64")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds every stub waits before answering")
+    parser.add_argument("--items", type=int, default=100, help="list length of stub payloads")
+    parser.add_argument("--routes", default="", help="comma separated gateway routes, defaults to a mix of read routes")
+    parser.add_argument("--save", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    args = parser.parse_args()
+
+    ports = {service: free_port() for service in SERVICES}
+    stubs = Process(target=serve, args=(ports, args.latency, args.items), daemon=True)
+    stubs.start()
+    for service, port in ports.items():
+        os.environ[f"{service.upper()}_SERVICE"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("JWT_SECRET", "benchmark")
+    os.environ.setdefault("JWT_ALG", "HS256")
+    os.environ.setdefault("EXPIRE", "1")
+    os.environ.setdefault("CLIENT", "http://localhost")
+    # a single benchmark user would measure its own quotas, set RATE_LIMIT to measure the limiter
+    os.environ.setdefault("RATE_LIMIT", "off")
+
+    for port in ports.values():
+        for _ in range(100):
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/docs")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+
+    try:
+        print_header()
+        results = asyncio.run(bench(args))
+    finally:
+        # uvicorn only lets the last of several servers in a process handle SIGTERM
+        stubs.kill()
+        stubs.join()
+
+    if args.save:
+        os.makedirs(BASELINES, exist_ok=True)
+        with open(os.path.join(BASELINES, f"{args.save}.json"), "w") as f:
+            json.dump({
+                "commit": commit(),
+                "settings": {"duration": args.duration, "latency": args.latency, "items": args.items, "routes": args.routes or ",".join(ROUTES)},
+                "results": results,
+            }, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# CPU time per response of the routes that render through a ResponseAdapter, old code path against new.
+#   python benchmarks/serialize_bench.py [--items 10,100,1000] [--number 200]
+#
+# before:    the handlers before the route table: res.json(), the result built with m(**x), then
+#            FastAPI's serialize_response (response_model validation for /user, jsonable_encoder
+#            for the inventory models) and JSONResponse
+# validated: ResponseAdapter, pydantic-core parses and validates the bytes and renders the models
+# trusted:   ResponseAdapter(trusted=True), orjson with a projection onto the model fields
+#
+# post_to_inv returns the same model as post_inv; before the route table it passed `dict` as the
+# response type and failed, so it has no old path of its own.
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from apigateway import schema
+from apigateway.Serialization import ResponseAdapter
+
+import stubs
+
+
+def user(items: int) -> bytes:
+    return json.dumps({
+        "id": 1, "username": "bench", "email": "bench@example.com", "gender": "other",
+        "birthday": "1970-01-01", "created": "2023-01-01T00:00:00",
+        "target_energy": {"calories": 2000, "fat": 60, "carbohydrates": 60, "protein": 60},
+    }).encode()
+
+
+def inventory(items: int) -> bytes:
+    return json.dumps({
+        "id": 1, "userId": 1, "name": "fridge",
+        "items": [{"id": i, "foodId": i % 50, "expirationDate": "2024-01-01", "timestamp": "2023-01-01", "food": stubs.food(i % 50)} for i in range(items)],
+    }).encode()
+
+
+def before_get_user():
+    # add_api_route("/user", ..., response_model=schema.User) returning the upstream dict
+    field = create_response_field(name="Response_get_user", type_=schema.User, mode="serialization")
+
+    async def render(content: bytes) -> bytes:
+        res = dict(**json.loads(content))
+        return JSONResponse(await serialize_response(field=field, response_content=res)).body
+    return render
+
+
+def before_post_inv():
+    # no response_model, the handler returned schema.Inventory(**res.json())
+    async def render(content: bytes) -> bytes:
+        res = schema.Inventory(**json.loads(content))
+        return JSONResponse(await serialize_response(response_content=res)).body
+    return render
+
+
+ROUTES = {
+    "get_user": (user, schema.User, before_get_user),
+    "post_inv": (inventory, schema.Inventory, before_post_inv),
+}
+
+
+def pipeline(model, trusted: bool):
+    adapter = ResponseAdapter(model, trusted)
+
+    async def render(content: bytes) -> bytes:
+        return adapter.render(adapter.parse(content)).body
+    return render
+
+
+def measure(render, content: bytes, number: int) -> float:
+    async def run() -> float:
+        await render(content)
+        start = time.process_time()
+        for _ in range(number):
+            await render(content)
+        return (time.process_time() - start) / number
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", default="10,100,1000", help="inventory items, /user has a fixed size")
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'route':<10} {'items':>6} {'before':>12} {'validated':>12} {'trusted':>12}")
+    for name, (payload, model, before) in ROUTES.items():
+        for items in (int(n) for n in args.items.split(",")) if payload is not user else [1]:
+            content = payload(items)
+            old, validated, trusted = (measure(render, content, args.number) for render in (before(), pipeline(model, False), pipeline(model, True)))
+            print(f"{name:<10} {items if payload is not user else '-':>6} {old * 1e6:>10.1f}us {validated * 1e6:>10.1f}us {trusted * 1e6:>10.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# In-process stand-ins for the backend services, with configurable latency and payload size.
+import asyncio
+import socket
+
+from fastapi import FastAPI, Request
+import uvicorn
+
+SERVICES = ["user", "health", "food", "inventory", "mealplan", "recipe"]
+
+
+def food(id: int) -> dict:
+    return {
+        "id": id, "name": f"food {id}", "price": 10.0, "priceKg": 20.0, "discount": 0.0,
+        "vendor": "vendor", "category": "category", "fat": 1.0, "carbs": 2.0, "protein": 3.0, "cal": 40.0,
+    }
+
+
+def stub_app(service: str, latency: float, items: int) -> FastAPI:
+    app = FastAPI()
+
+    async def wait():
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+    if service == "user":
+        @app.get("/user/{id}")
+        async def get_user(id: int):
+            await wait()
+            return {
+                "id": id, "username": "bench", "email": "bench@example.com", "gender": "other",
+                "birthday": "1970-01-01", "created": "2023-01-01T00:00:00",
+                "target_energy": {"calories": 2000, "fat": 60, "carbohydrates": 60, "protein": 60},
+            }
+
+        @app.post("/validate")
+        async def validate():
+            await wait()
+            return {"success": True, "id": 1}
+
+    elif service == "health":
+        @app.get("/UserHealthHistory")
+        async def history(userID: int):
+            await wait()
+            return [
+                {"id": i, "userID": userID, "dateStamp": "2023-01-01T00:00:00", "height": 180.0, "weight": 80.0,
+                 "fatPercentage": 20.0, "musclePercentage": 40.0, "waterPercentage": 50.0}
+                for i in range(items)
+            ]
+
+    elif service == "food":
+        @app.get("/api/foods")
+        async def search(query: str = ""):
+            await wait()
+            return [food(i) for i in range(items)]
+
+        @app.get("/api/foods/discounted")
+        async def discounted():
+            await wait()
+            return [food(i) for i in range(items)]
+
+        @app.get("/api/foods/{id}")
+        async def item(id: int):
+            await wait()
+            return food(id)
+
+        @app.post("/api/foods/list")
+        async def foods(request: Request):
+            await wait()
+            return [food(i) for i in await request.json()]
+
+    elif service == "inventory":
+        @app.get("/api/inventories/user/{id}")
+        async def inventories(id: int):
+            await wait()
+            return [{
+                "id": 1, "userId": id, "name": "fridge",
+                "items": [{"id": i, "foodId": i % 50, "expirationDate": "2024-01-01", "timestamp": "2023-01-01"} for i in range(items)],
+            }]
+
+    elif service == "mealplan":
+        @app.get("/mealPlan/{id}")
+        async def current(id: int):
+            await wait()
+            return {"id": 1, "startDate": "2023-12-11", "endDate": "2023-12-18", "recipes": list(range(items))}
+
+        @app.get("/mealPlans/{id}")
+        async def plans(id: int):
+            await wait()
+            return [{"id": i, "startDate": "2023-12-11", "endDate": "2023-12-18"} for i in range(items)]
+
+        @app.post("/generate")
+        async def generate():
+            await wait()
+            return {"success": True}
+
+    elif service == "recipe":
+        @app.get("/recipe/{id}")
+        async def recipe(id: int):
+            await wait()
+            return {
+                "title": f"recipe {id}", "servings": 4, "instructions": "Stir. " * items, "url": "https://example.com",
+                "energy": {"calories": 500, "fat": 20, "protein": 30, "carbohydrates": 50},
+                "ingredients": [{"amount": 1.0, "unit": "g", "item": f"item {i}"} for i in range(items)],
+                "tags": ["bench"],
+            }
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(ports: dict[str, int], latency: float, items: int):
+    # entry point of the stub process, one uvicorn server per service
+    servers = [
+        uvicorn.Server(uvicorn.Config(stub_app(service, latency, items), host="127.0.0.1", port=port, log_level="warning", access_log=False))
+        for service, port in ports.items()
+    ]
+
+    async def main():
+        await asyncio.gather(*(server.serve() for server in servers))
+    asyncio.run(main())
@@ -1,66 +1,246 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request, Header, Path
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Header, Query
+from inspect import Parameter, Signature
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from typing import Annotated
+from typing import Annotated, Any
 from datetime import timedelta
 import json
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from contextvars import ContextVar
+from hashlib import blake2b
+import asyncio
+import hmac
+import logging
+import orjson
 
 from .Service import Service, ResponseType
+from .Routes import Route, Template, load_routes
 from .Authentication import JWTEncoder
+from .Cache import TTLCache
+from .Compose import BatchLoader, join
+from .Batch import Batch
+from .RateLimit import RateLimiter, RateStore, Quota
+from .Serialization import ResponseAdapter
+from .Compression import CompressionMiddleware
+from .Concurrency import prioritize
+from .Conditional import ConditionalMiddleware
+from .Jobs import JobRunner, JobStore
+from .Paging import Pagination, PageRequest, NEXT_CURSOR
+from .Profiler import Sampler
+from .Metrics import MetricsMiddleware, metrics, phase, current
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse, ORJSONResponse
+from time import perf_counter
 from . import schema
 
+logger = logging.getLogger(__name__)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
+
+_param_types = {"int": int, "float": float, "str": str}
+
+_inventory_pages = Pagination()
+
+# token and claims of a batch, verified once for all of its items
+_authenticated: ContextVar[tuple[str, dict] | None] = ContextVar("authenticated", default=None)
 
 class APIGateway:
-    def __init__(self, app: FastAPI, cfg: dict, jwtencoder: JWTEncoder, services: dict[str, Service], origins: list[str]) -> None:
+    def __init__(self, app: FastAPI, cfg: dict, jwtencoder: JWTEncoder, services: dict[str, Service], origins: list[str], rate_store: RateStore | None = None, job_store: JobStore | None = None) -> None:
         self.__app = app
         self.__cfg = cfg
         self.__jwt = jwtencoder
         self.__services = services
+        self.__foods = BatchLoader(
+            services["food"], "/api/foods/list",
+            chunk_size=int(cfg.get("FOOD_BATCH_SIZE") or 100),
+            cache=TTLCache(int(cfg.get("FOOD_CACHE_MAX_ENTRIES") or 10000)),
+            ttl=float(cfg.get("FOOD_CACHE_TTL") or 600),
+        )
+        self.__batch = Batch(app.router, concurrency=int(cfg.get("BATCH_CONCURRENCY") or 8))
+        self.__batch_max = int(cfg.get("BATCH_MAX_REQUESTS") or 50)
+        self.__limiter = RateLimiter(rate_store)
+        self.__jobs = JobRunner(
+            job_store,
+            workers=int(cfg.get("JOB_WORKERS") or 4),
+            queue_size=int(cfg.get("JOB_QUEUE") or 100),
+        )
+        self.__profiler = Sampler()
+        self.__quota = None
+        self.__rate_limits = str(cfg.get("RATE_LIMIT") or "").lower() != "off"
+        if cfg.get("RATE_LIMIT") and self.__rate_limits:
+            self.__quota = Quota.parse(cfg["RATE_LIMIT"], algorithm=cfg.get("RATE_LIMIT_ALGORITHM") or "token_bucket")
         self.__app.add_middleware(
             CORSMiddleware,
             allow_origins=origins,
             allow_credentials=True,
             allow_methods=["*"],
             allow_headers=["*"],
+            expose_headers=[NEXT_CURSOR],
         )
+        if str(cfg.get("CONDITIONAL") or "true").lower() == "true":
+            self.__app.add_middleware(ConditionalMiddleware, max_size=int(cfg.get("ETAG_MAX_SIZE") or 1024 * 1024))
+        self.__no_compress: set[str] = set()
+        if str(cfg.get("COMPRESSION") or "true").lower() == "true":
+            self.__app.add_middleware(
+                CompressionMiddleware,
+                minimum_size=int(cfg.get("COMPRESSION_MIN_SIZE") or 500),
+                levels={name: int(cfg[f"COMPRESSION_{name.upper()}_LEVEL"]) for name in ("gzip", "br", "zstd") if cfg.get(f"COMPRESSION_{name.upper()}_LEVEL")},
+                exclude=self.__no_compress,
+            )
+        if str(cfg.get("METRICS") or "true").lower() == "true":
+            self.__app.add_middleware(MetricsMiddleware, server_timing=str(cfg.get("SERVER_TIMING") or "true").lower() == "true")
+            metrics.collector(self.__pool_gauges)
+        self.__app.add_event_handler("startup", self.startup)
+        self.__app.add_event_handler("shutdown", self.shutdown)
 
-    def configure_routes(self):
-        self.__app.add_api_route("/user", self.get_user, methods=["GET"], status_code=200, response_model=schema.User, tags=["users"])
-        self.__app.add_api_route("/user", self.create_user, methods=["POST"], status_code=201, tags=["users"])
-        self.__app.add_api_route("/user", self.delete_user, methods=["DELETE"], status_code=200, tags=["users"])
-        self.__app.add_api_route("/login", self.login, methods=["POST"], status_code=200, tags=["users"])
-
-        # health service
-        self.__app.add_api_route("/health", self.create_health, methods=["POST"], status_code=201, tags=["health"])
-        self.__app.add_api_route("/health/{id}", self.delete_health, methods=["DELETE"], status_code=200, tags=["health"])
-        self.__app.add_api_route("/health/history", self.get_health_history, methods=["GET"], status_code=200, tags=["health"])
-
-        # inventory service
-        self.__app.add_api_route("/inventories", self.get_invs, methods=["GET"], status_code=200, tags=["inventory"])
-        self.__app.add_api_route("/inventories/{inv_id}", self.post_to_inv, methods=["POST"], status_code=200, tags=["inventory"])
-        self.__app.add_api_route("/inventories", self.post_inv, methods=["POST"], status_code=200, tags=["inventory"])
-        self.__app.add_api_route("/inventories/{inv_id}", self.delete_inv, methods=["DELETE"], status_code=200, tags=["inventory"])
-        self.__app.add_api_route("/inventories/{inv_id}/{item_id}", self.delete_inv_item, methods=["DELETE"], status_code=200, tags=["inventory"])
-
-        # food service
-        self.__app.add_api_route("/foods", self.get_foods, methods=["GET"], status_code=200, tags=["food"])
-        self.__app.add_api_route("/foods/{id}", self.get_food_item, methods=["GET"], status_code=200, tags=["food"])
-        self.__app.add_api_route("/foods/discounted", self.get_foods_discounted, methods=["GET"], status_code=200, tags=["food"])
-
-        # mealplan service
-        self.__app.add_api_route("/meal", self.create_meal_plan, methods=["POST"], status_code=201, tags=["mealplan"])
-        self.__app.add_api_route("/mealRecipe", self.create_meal_plan_recipe, methods=["POST"], status_code=201, tags=["mealplan"])
-        self.__app.add_api_route("/mealsPerDay", self.create_meals_per_day, methods=["POST"], status_code=201, tags=["mealplan"])
-        self.__app.add_api_route("/generate", self.generate_meal_plan, methods=["POST"], status_code=201, tags=["mealplan"])
-        self.__app.add_api_route("/mealPlan", self.get_current_meal_plan, methods=["GET"], status_code=200, tags=["mealplan"])
-        self.__app.add_api_route("/mealPlan/all", self.get_all_meal_plans, methods=["GET"], status_code=200, tags=["mealplan"])
-        self.__app.add_api_route("/mealPlan", self.delete_meal_plan, methods=["DELETE"], status_code=200, tags=["mealplan"])
-
-        #recipe service
-        self.__app.add_api_route("/recipe/{id}", self.get_recipe, methods=["GET"], status_code=200, tags=["recipe"])
-    
+    def __pool_gauges(self):
+        for service in self.__services.values():
+            stats = service.pool_stats()
+            labels = (("service", service.name),)
+            yield "upstream_requests_in_flight", labels, stats["in_flight"]
+            yield "upstream_requests_waiting", labels, stats["waiting"]
+            yield "upstream_connections", labels, stats["connections"]
+            yield "upstream_idle_connections", labels, stats["idle_connections"]
+            if stats["concurrency"] is not None:
+                yield "upstream_concurrency_limit", labels, stats["concurrency"]["limit"]
+                yield "upstream_requests_queued", labels, stats["concurrency"]["queued"]
+
+    async def startup(self):
+        await asyncio.gather(*(s.open() for s in self.__services.values()))
+        if str(self.__cfg.get("WARMUP") or "true").lower() == "true":
+            await self.warmup()
+        self.__jobs.start()
+
+    async def warmup(self):
+        # pays for what the first requests would otherwise wait for, before the worker takes traffic
+        start = perf_counter()
+        self.__app.openapi()
+        self.__jwt.warmup()
+        connections = int(self.__cfg.get("WARMUP_CONNECTIONS") or 2)
+        path = self.__cfg.get("WARMUP_PATH") or "/"
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(s.warmup(connections, path) for s in self.__services.values())),
+                float(self.__cfg.get("WARMUP_TIMEOUT") or 10),
+            )
+        except asyncio.TimeoutError:
+            logger.warning("warming up the services did not finish in time")
+        logger.info("warmed up in %.3fs", perf_counter() - start)
+
+    async def shutdown(self):
+        self.__profiler.stop()
+        await self.__jobs.stop()
+        await asyncio.gather(*(s.close() for s in self.__services.values()))
+
+    def configure_routes(self, routes: list[Route] | None = None):
+        self.__app.add_api_route("/user", self.delete_user, methods=["DELETE"], status_code=200, tags=["users"], dependencies=self.rate_limit("delete_user"))
+        self.__app.add_api_route("/login", self.login, methods=["POST"], status_code=200, tags=["users"], dependencies=self.rate_limit("login"))
+        self.__app.add_api_route("/inventories", self.get_invs, methods=["GET"], status_code=200, tags=["inventory"], dependencies=self.rate_limit("get_invs"))
+        self.__app.add_api_route("/inventories/{inv_id}", self.delete_inv, methods=["DELETE"], status_code=200, tags=["inventory"], dependencies=self.rate_limit("delete_inv"))
+        self.__app.add_api_route("/batch", self.batch, methods=["POST"], status_code=200, tags=["batch"], dependencies=self.rate_limit("batch"))
+        self.__app.add_api_route("/jobs/{job_id}", self.get_job, methods=["GET"], status_code=200, tags=["jobs"], dependencies=self.rate_limit("get_job"))
+        self.__app.add_api_route("/jobs/{job_id}/events", self.get_job_events, methods=["GET"], status_code=200, tags=["jobs"], dependencies=self.rate_limit("get_job_events"))
+        # events are sent as they happen, a compressor would hold them back
+        self.__no_compress.add("get_job_events")
+
+        # routes that only forward to a service
+        for route in routes if routes is not None else load_routes():
+            if not route.compress:
+                self.__no_compress.add(route.name)
+            self.__app.add_api_route(
+                route.path,
+                self.proxy(route),
+                methods=[route.method],
+                status_code=route.status_code,
+                response_model=getattr(schema, route.response_model) if route.response_model else None,
+                tags=route.tags,
+                dependencies=self.rate_limit(route.name, route.rate_limit),
+            )
+
+        # gateway internals
+        self.__app.add_api_route("/status/pools", self.get_pool_stats, methods=["GET"], status_code=200, tags=["internal"], dependencies=[Depends(self.admin)])
+        self.__app.add_api_route("/status/cache", self.get_cache_stats, methods=["GET"], status_code=200, tags=["internal"], dependencies=[Depends(self.admin)])
+        self.__app.add_api_route("/status/latency", self.get_latency_stats, methods=["GET"], status_code=200, tags=["internal"], dependencies=[Depends(self.admin)])
+        self.__app.add_api_route("/metrics", self.get_metrics, methods=["GET"], status_code=200, tags=["internal"], dependencies=[Depends(self.admin)], response_class=PlainTextResponse)
+        self.__app.add_api_route("/status/upstreams", self.get_upstream_stats, methods=["GET"], status_code=200, tags=["internal"], dependencies=[Depends(self.admin)])
+        self.__app.add_api_route("/status/jobs", self.get_job_stats, methods=["GET"], status_code=200, tags=["internal"], dependencies=[Depends(self.admin)])
+        self.__app.add_api_route("/profiler", self.get_profile, methods=["GET"], status_code=200, tags=["internal"], dependencies=[Depends(self.admin)], response_class=PlainTextResponse)
+        self.__app.add_api_route("/profiler/start", self.start_profiler, methods=["POST"], status_code=200, tags=["internal"], dependencies=[Depends(self.admin)])
+        self.__app.add_api_route("/profiler/stop", self.stop_profiler, methods=["POST"], status_code=200, tags=["internal"], dependencies=[Depends(self.admin)])
+
+    def admin(self, x_admin_token: Annotated[str | None, Header()] = None, authorization: Annotated[str | None, Header()] = None):
+        expected = self.__cfg.get("ADMIN_TOKEN")
+        if not expected:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        # scrapers such as Prometheus can only send the token as a bearer token
+        if x_admin_token is None and authorization is not None and authorization.startswith("Bearer "):
+            x_admin_token = authorization[7:]
+        if x_admin_token is None or not hmac.compare_digest(x_admin_token, expected):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    def rate_limit(self, name: str, quota: Quota | None = None) -> list:
+        # RATE_LIMIT_<ROUTE NAME>=<limit>/<period> replaces the quota of a route and =off removes it
+        override = self.__cfg.get(f"RATE_LIMIT_{name.upper()}")
+        if override is not None:
+            quota = None if override.lower() == "off" else Quota.parse(
+                override,
+                algorithm=quota.algorithm if quota is not None else self.__cfg.get("RATE_LIMIT_ALGORITHM") or "token_bucket",
+                key=quota.key if quota is not None else "user",
+                )
+            if quota is None:
+                return []
+        quota = quota if quota is not None else self.__quota
+        if quota is None or not self.__rate_limits:
+            return []
+        limiter = self.__limiter
+
+        async def limit(request: Request, token: Annotated[str | None, Depends(optional_oauth2_scheme)]):
+            key = None
+            if token is not None and quota.key == "user":
+                try:
+                    key = f"user:{self.auth(token)['id']}"
+                except HTTPException:
+                    pass
+            if key is None:
+                key = f"ip:{request.client.host if request.client is not None else ''}"
+            await limiter.check(name, quota, key)
+        return [Depends(limit)]
+
+    async def get_pool_stats(self):
+        return {name: service.pool_stats() for name, service in self.__services.items()}
+
+    async def get_metrics(self):
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    async def get_latency_stats(self):
+        return metrics.latency()
+
+    async def get_profile(self):
+        # folded stacks, e.g. flamegraph.pl profile.txt > profile.svg or drop the file on speedscope
+        return PlainTextResponse(self.__profiler.folded())
+
+    async def start_profiler(self,
+                             interval: Annotated[float, Query(ge=0.001, le=0.1, description="seconds between samples")] = 0.005,
+                             duration: Annotated[float, Query(ge=1, le=3600, description="seconds until it stops by itself")] = 60,
+                             ):
+        # samples the event loop thread of this worker, which is the thread handling this request
+        self.__profiler.start(interval, duration)
+        return self.__profiler.stats()
+
+    async def stop_profiler(self):
+        self.__profiler.stop()
+        return self.__profiler.stats()
+
+    async def get_job_stats(self):
+        return self.__jobs.stats()
+
+    async def get_upstream_stats(self):
+        return {name: service.resilience_stats() for name, service in self.__services.items()}
+
+    async def get_cache_stats(self):
+        stats = {name: service.cache_stats() for name, service in self.__services.items() if service.cache is not None}
+        stats["food_ids"] = self.__foods.stats()
+        stats["tokens"] = self.__jwt.cache_stats()
+        return stats
 
     def auth(self, token: str):
         credentials_exception = HTTPException(
@@ -68,17 +248,166 @@ class APIGateway:
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
             )
+        authenticated = _authenticated.get()
+        if authenticated is not None and authenticated[0] == token:
+            return authenticated[1]
+        start = perf_counter()
         decoded = self.__jwt.decode_token(token)
+        phase("auth", perf_counter() - start)
         if not decoded:
             raise credentials_exception
         return decoded
 
-    async def get_user(self, token: Annotated[str, Depends(oauth2_scheme)]):
-        id = self.auth(token)["id"]
-        user_service = self.__services["user"]
-        res = await user_service.request("get", f"/user/{id}", dict)
-        return res
+    def proxy(self, route: Route):
+        # everything that can be resolved from the route is resolved here, once, at startup
+        service = self.__services[route.service]
+        method = route.method.lower()
+        upstream = Template(route.upstream)
+        res_type = ResponseType.RAW if route.response == "raw" else ResponseType.JSON
+        success = route.response in ("success", "ok")
+        acknowledge = route.response == "ok"
+        requires_auth = route.auth
+        user_field = route.user
+        body_model = getattr(schema, route.body) if route.body else None
+        upstream_model = getattr(schema, route.upstream_body) if route.upstream_body else None
+        response_model = getattr(schema, route.response_model) if route.response_model else Any
+        adapter = ResponseAdapter(response_model, service.trusted) if res_type is ResponseType.JSON and not success else None
+        status_code = route.status_code
+        priority = route.priority
+        if route.job and res_type is ResponseType.RAW:
+            raise ValueError(f"{route.name}: raw responses cannot be run as jobs")
+        pagination = route.page
+        if pagination is not None and adapter is not None:
+            raise ValueError(f"{route.name}: pages are cut from unvalidated lists, drop the response model")
+
+        def prepare(kwargs: dict) -> str | None:
+            if requires_auth:
+                kwargs["user_id"] = self.auth(kwargs.pop("token"))["id"]
+            data = None
+            if body_model is not None:
+                body = kwargs.pop("body")
+                if upstream_model is not None:
+                    body = upstream_model(**{user_field: kwargs["user_id"]}, **body.model_dump())
+                elif user_field is not None:
+                    setattr(body, user_field, kwargs["user_id"])
+                data = body.model_dump_json()
+            return data
+
+        def render(res):
+            if acknowledge:
+                return {"success": True}
+            if success:
+                return {"success": res.get("success", True) if isinstance(res, dict) else True}
+            if adapter is not None:
+                # rendered here, FastAPI leaves Response objects alone instead of validating them again
+                return adapter.render(res, status_code)
+            return res
+
+        async def endpoint(**kwargs):
+            prioritize(priority)
+            timing = current()
+            if timing is not None:
+                timing.entered = perf_counter()
+            page = None
+            if pagination is not None:
+                limit, cursor, fields = kwargs.pop("limit"), kwargs.pop("cursor"), kwargs.pop("fields")
+                if limit is not None or cursor is not None or fields:
+                    page = PageRequest(pagination, limit, cursor, fields)
+            data = prepare(kwargs)
+            if page is not None:
+                return await paged(page, upstream.render(kwargs), data)
+            res = await service.request(method, upstream.render(kwargs), adapter, res_type, data)
+            if timing is not None:
+                timing.left = perf_counter()
+            return render(res)
+
+        async def paged(page: PageRequest, path: str, data: str | None) -> Response:
+            # the list is decoded without validation and only the page is projected and rendered
+            res, next_cursor = page.apply(await service.request(method, page.url(path), None, ResponseType.PRIM, data))
+            headers = {NEXT_CURSOR: next_cursor} if next_cursor is not None else None
+            return Response(orjson.dumps(res), status_code, headers=headers, media_type="application/json")
+
+        async def job_endpoint(**kwargs):
+            data = prepare(kwargs)
+            path = upstream.render(kwargs)
+            owner = kwargs.get("user_id")
+            key = blake2b(f"{route.name} {owner} {path} {data}".encode(), digest_size=16).hexdigest()
+
+            async def call() -> bytes:
+                prioritize(priority)
+                res = render(await service.request(method, path, adapter, res_type, data))
+                return res.body if isinstance(res, Response) else orjson.dumps(res)
+            job = await self.__jobs.submit(key, owner, call)
+            return Response(job.render(), status.HTTP_202_ACCEPTED, headers={"Location": f"/jobs/{job.id}"}, media_type="application/json")
+
+        params = []
+        if requires_auth:
+            params.append(Parameter("token", Parameter.KEYWORD_ONLY, annotation=Annotated[str, Depends(oauth2_scheme)]))
+        for name, type_name in route.params.items():
+            params.append(Parameter(name, Parameter.KEYWORD_ONLY, annotation=_param_types[type_name]))
+        if body_model is not None:
+            params.append(Parameter("body", Parameter.KEYWORD_ONLY, annotation=body_model))
+        if pagination is not None:
+            params.extend(self.__page_params(pagination))
+        if route.job:
+            endpoint = job_endpoint
+        endpoint.__signature__ = Signature(params)
+        endpoint.__name__ = route.name
+        return endpoint
+
+    @staticmethod
+    def __page_params(pagination: Pagination) -> list[Parameter]:
+        return [
+            Parameter("limit", Parameter.KEYWORD_ONLY, annotation=Annotated[int | None, Query(ge=1, le=pagination.max_limit)], default=None),
+            Parameter("cursor", Parameter.KEYWORD_ONLY, annotation=Annotated[str | None, Query(description="X-Next-Cursor of the previous page")], default=None),
+            Parameter("fields", Parameter.KEYWORD_ONLY, annotation=Annotated[str | None, Query(description="comma separated fields to return of every item")], default=None),
+        ]
+
+    async def batch(self, batch: schema.BatchRequest, request: Request, token: Annotated[str, Depends(oauth2_scheme)]):
+        claims = self.auth(token)
+        if len(batch.requests) > self.__batch_max:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"At most {self.__batch_max} requests per batch")
+        headers = [(b"authorization", f"Bearer {token}".encode())]
+
+        if batch.stream:
+            async def lines():
+                # runs in the task of the streaming response, so the override ends with it
+                _authenticated.set((token, claims))
+                async for result in self.__batch.run(request.scope, batch.requests, headers):
+                    yield result.render() + b"\n"
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        reset = _authenticated.set((token, claims))
+        try:
+            results = [result async for result in self.__batch.run(request.scope, batch.requests, headers)]
+        finally:
+            _authenticated.reset(reset)
+        results.sort(key=lambda result: result.index)
+        return Response(b"[" + b",".join(result.render() for result in results) + b"]", media_type="application/json")
+
+    def __owner(self, token: str | None) -> int | str | None:
+        # jobs of routes without authentication belong to nobody and only need their ID
+        return self.auth(token)["id"] if token is not None else None
+
+    async def get_job(self, job_id: str, token: Annotated[str | None, Depends(optional_oauth2_scheme)]):
+        job = await self.__jobs.get(job_id, self.__owner(token))
+        headers = {} if job.done else {"Retry-After": "1"}
+        return Response(job.render(), headers=headers, media_type="application/json")
+
+    async def get_job_events(self, job_id: str, token: Annotated[str | None, Depends(optional_oauth2_scheme)]):
+        owner = self.__owner(token)
+        await self.__jobs.get(job_id, owner)
+
+        async def events():
+            async for job in self.__jobs.watch(job_id, owner):
+                if job is None:
+                    yield b": keep-alive\n\n"
+                else:
+                    yield b"event: " + job.status.encode() + b"\ndata: " + job.render() + b"\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
     async def login(self, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
+        prioritize("interactive")
         user_service = self.__services["user"]
         res = await user_service.request(
             "post",
@@ -97,77 +426,31 @@ class APIGateway:
         token = self.__jwt.encode(form_data.username, res["id"], timedelta(days=float(self.__cfg["EXPIRE"])))
         return {"access_token": token, "token_type": "bearer"}
     
-    async def create_user(self, account: schema.UserCreate):
-        user_service = self.__services["user"]
-        res = await user_service.request(
-            "post", "/user",
-            dict,
-            data=account.model_dump_json()
-        )
-        return {"success": res["success"]}
-
     async def delete_user(self, token: Annotated[str, Depends(oauth2_scheme)]):
         id = self.auth(token)["id"]
         user_service = self.__services["user"]
-        return await user_service.request("delete", f"/user/{id}", dict)
+        res = await user_service.request("delete", f"/user/{id}", dict)
+        self.__jwt.revoke_user(id)
+        return res
 
 
-    async def get_foods(self, query: str):
-        food_service = self.__services["food"]
-        res = await food_service.request(
-            "get", f"/api/foods?query={query}",
-            list,
-            ResponseType.PRIM
-        )
-        return res
-    
-    async def get_food_item(self, id: int):
-        food_service = self.__services["food"]
-        res = await food_service.request(
-            "get", f"/api/foods/{id}",
-            schema.Food,
-            dict
-        )
-        return res
-    
-    async def get_foods_discounted(self):
-        food_service = self.__services["food"]
-        res = await food_service.request(
-            "get", f"/api/foods/discounted",
-            schema.Food,
-            dict
-        )
-        return res
-    
-    async def post_to_inv(self, token: Annotated[str, Depends(oauth2_scheme)], inv_id: int, inv_item: schema.InventoryItem):
-        id = self.auth(token)["id"]
-        inv_service = self.__services["inventory"]
-        res = await inv_service.request("post", f"/api/inventories/{inv_id}", schema.Inventory, dict, inv_item.model_dump_json())
-        return res
-    
-    async def get_invs(self, token: Annotated[str, Depends(oauth2_scheme)]):
-        id = self.auth(token)["id"]
-        inv_service = self.__services["inventory"]
-        food_service = self.__services["food"]
-        invs = await inv_service.request("get", f"/api/inventories/user/{id}", list, ResponseType.PRIM)
-
-        food_ids = []
-        for inv in invs:
-            for item in inv["items"]:
-                food_ids.append(item["foodId"])
-        foods = await food_service.request("post", f"/api/foods/list", list, ResponseType.PRIM, json.dumps(food_ids))
-        for inv in invs:
-            for i in inv["items"]:
-                matching_food = next((f for f in foods if f["id"] == i["foodId"]), None)
-                i["food"] = matching_food
-        return invs
-    
-    async def post_inv(self, token: Annotated[str, Depends(oauth2_scheme)], inventory: schema.Inventory):
+    async def get_invs(self,
+                       token: Annotated[str, Depends(oauth2_scheme)],
+                       limit: Annotated[int | None, Query(ge=1, le=_inventory_pages.max_limit)] = None,
+                       cursor: Annotated[str | None, Query(description="X-Next-Cursor of the previous page")] = None,
+                       fields: Annotated[str | None, Query(description="comma separated fields to return of every inventory")] = None,
+                       ):
         id = self.auth(token)["id"]
         inv_service = self.__services["inventory"]
-        inventory.userId = id
-        res = await inv_service.request("post", f"/api/inventories", schema.Inventory, ResponseType.DICT, inventory.model_dump_json())
-        return res
+        page = PageRequest(_inventory_pages, limit, cursor, fields)
+        invs = await inv_service.request("get", page.url(f"/api/inventories/user/{id}"), list, ResponseType.PRIM)
+        # foods are only loaded for the inventories of the page, and not at all without their items
+        invs, next_cursor = page.apply(invs)
+
+        items = [item for inv in invs for item in inv.get("items", ())]
+        foods = await self.__foods.load(item["foodId"] for item in items)
+        join(items, "foodId", foods, "food")
+        return ORJSONResponse(invs, headers={NEXT_CURSOR: next_cursor} if next_cursor is not None else None)
     
     async def delete_inv(self, inv_id: int, inventory: schema.Inventory, token: Annotated[str, Depends(oauth2_scheme)]):
         id = self.auth(token)["id"]
@@ -178,108 +461,3 @@ class APIGateway:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
         inventory_service = self.__services["inventory"]
         return await inventory_service.request("delete", f"/api/inventories/{inv_id}", dict, ResponseType.DICT)
-    
-    async def delete_inv_item(self, token: Annotated[str, Depends(oauth2_scheme)], inv_id: int, item_id: int):
-        id = self.auth(token)["id"]
-        inventory_service = self.__services["inventory"]
-        return await inventory_service.request("delete", f"/api/inventories/{inv_id}/{item_id}", dict)
-    
-    async def put_inv(self, token: Annotated[str, Depends(oauth2_scheme)], inventory: schema.Inventory):
-        id = self.auth(token)["id"]
-        inventory_service = self.__services["inventory"]
-        return await inventory_service.request("put", f"/api/inventories/{inventory.id}", dict)
-
-    
-    async def create_health(self, token: Annotated[str, Depends(oauth2_scheme)], health: schema.BaseHealthEntry):
-        id = self.auth(token)["id"]
-        create_health = schema.CreateHealthEntry(userID=id, **health.model_dump())
-        health_service = self.__services["health"]
-        res = await health_service.request(
-            "post", "/insertHealth",
-            dict,
-            data=create_health.model_dump_json()
-        )
-        return {"success": res["success"]}
-    
-    async def delete_health(self, token: Annotated[str, Depends(oauth2_scheme)], id: int):
-        user_id = self.auth(token)["id"]
-        health_service = self.__services["health"]
-        res = await health_service.request(
-            "delete", f"/deleteHealth?id={id}&userID={user_id}",
-            dict
-        )
-        return {"success": res["success"]}
-
-    async def get_health_history(self, token: Annotated[str, Depends(oauth2_scheme)]):
-        id = self.auth(token)["id"]
-        health_service = self.__services["health"]
-        return await health_service.request("get", f"/UserHealthHistory?userID={id}", list, res_type=ResponseType.PRIM)
-
-    async def create_meal_plan(self, token: Annotated[str, Depends(oauth2_scheme)], meal: schema.BaseMealPlan):
-        user_id = self.auth(token)["id"]
-        meal_plan = schema.CreateBaseMealPlan(userID=user_id, **meal.model_dump())
-        mealplan_service = self.__services["mealplan"]
-        await mealplan_service.request(
-            "post", "/mealPlan",
-            int,
-            data=meal_plan.model_dump_json(),
-            res_type=ResponseType.PRIM
-        )
-        return {"success": True}
-    
-    async def create_meal_plan_recipe(self, mealRecipe: schema.MealPlanRecipe):
-        mealplan_service = self.__services["mealplan"]
-        await mealplan_service.request(
-            "post", "/mealPlanRecipe",
-            str,
-            data=mealRecipe.model_dump_json(),
-            res_type=ResponseType.PRIM
-        )
-        return {"success": True}
-    
-    async def create_meals_per_day(self, mealsPerDay: schema.MealsPerDay):
-        mealplan_service = self.__services["mealplan"]
-        await mealplan_service.request(
-            "post", "/mealsPerDay",
-            str,
-            data=mealsPerDay.model_dump_json(),
-            res_type=ResponseType.PRIM
-        )
-        return {"success": True}
-    
-
-    async def generate_meal_plan(self, token: Annotated[str, Depends(oauth2_scheme)], generate_meal: schema.GenerateMealPlan):
-        user_id = self.auth(token)["id"]
-        mealplan_service = self.__services["mealplan"]
-        generate_meal_plan = schema.CreateGenerateMealplan(userID=user_id, **generate_meal.model_dump())
-        await mealplan_service.request(
-            "post", "/generate",
-            dict,
-            data=generate_meal_plan.model_dump_json()
-        )
-        return {"success": True}
-    
-    async def get_current_meal_plan(self, token: Annotated[str, Depends(oauth2_scheme)]):
-        user_id = self.auth(token)["id"]
-        mealplan_service = self.__services["mealplan"]
-        return await mealplan_service.request("get", f"/mealPlan/{user_id}", dict, res_type=ResponseType.PRIM)
-
-    async def get_all_meal_plans(self, token: Annotated[str, Depends(oauth2_scheme)]):
-        user_id = self.auth(token)["id"]
-        mealplan_service = self.__services["mealplan"]
-        return await mealplan_service.request("get", f"/mealPlans/{user_id}", dict, res_type=ResponseType.PRIM)
-
-    async def delete_meal_plan(self, token: Annotated[str, Depends(oauth2_scheme)], planID: int):
-        user_id = self.auth(token)["id"]
-        mealplan_service = self.__services["mealplan"]
-        await mealplan_service.request(
-            "delete", f"/mealPlan/{planID}/{user_id}",
-            str,
-            res_type=ResponseType.PRIM
-        )
-        return {"success": True}
-        
-    async def get_recipe(self, token: Annotated[str, Depends(oauth2_scheme)], id: int = Path(...)):
-        self.auth(token)
-        recipe_service = self.__services["recipe"]
-        return await recipe_service.request("get", f"/recipe/{id}", dict, res_type=ResponseType.PRIM)
@@ -1,24 +1,222 @@
-from datetime import timedelta, datetime
-from jose import jwt, JWTError
+from datetime import timedelta
+from hashlib import blake2b, sha256, sha384, sha512
+from heapq import heappop, heappush
+from typing import Hashable
+import base64
+import hmac
+import json
+import math
+import time
+
+from .Cache import TTLCache
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _timestamp(value) -> bool:
+    # the claims of a correctly signed token can still hold any JSON value
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+class JoseBackend:
+    def __init__(self) -> None:
+        from jose import jwt, JWTError
+        self.__jwt = jwt
+        self.__error = JWTError
+
+    def encode(self, claims: dict, secret: str, alg: str) -> str:
+        return self.__jwt.encode(claims, secret, alg)
+
+    def decode(self, token: str, secret: str, alg: str) -> dict:
+        try:
+            return self.__jwt.decode(token, secret, algorithms=[alg])
+        except self.__error as e:
+            raise InvalidToken(str(e)) from e
+
+
+class PyJWTBackend:
+    def __init__(self) -> None:
+        try:
+            import jwt
+        except ImportError as e:
+            raise ImportError("JWT_BACKEND=pyjwt requires the PyJWT package") from e
+        self.__jwt = jwt
+
+    def encode(self, claims: dict, secret: str, alg: str) -> str:
+        return self.__jwt.encode(claims, secret, alg)
+
+    def decode(self, token: str, secret: str, alg: str) -> dict:
+        try:
+            return self.__jwt.decode(token, secret, algorithms=[alg])
+        except self.__jwt.PyJWTError as e:
+            raise InvalidToken(str(e)) from e
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+def _b64decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+class HMACBackend:
+    # stdlib-only HS256/HS384/HS512, skips the generic machinery of the JWT libraries
+    __digests = {"HS256": sha256, "HS384": sha384, "HS512": sha512}
+
+    def __digest(self, alg: str):
+        digest = self.__digests.get(alg)
+        if digest is None:
+            raise ValueError(f"JWT_BACKEND=hmac does not support {alg}")
+        return digest
+
+    def encode(self, claims: dict, secret: str, alg: str) -> str:
+        header = _b64encode(json.dumps({"alg": alg, "typ": "JWT"}, separators=(",", ":")).encode())
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        signing_input = header + b"." + payload
+        signature = hmac.new(secret.encode(), signing_input, self.__digest(alg)).digest()
+        return (signing_input + b"." + _b64encode(signature)).decode()
+
+    def decode(self, token: str, secret: str, alg: str) -> dict:
+        try:
+            signing_input, _, signature = token.encode().rpartition(b".")
+            header, _, payload = signing_input.partition(b".")
+            header = json.loads(_b64decode(header))
+            if not isinstance(header, dict) or header.get("alg") != alg:
+                raise InvalidToken("unexpected algorithm")
+            expected = hmac.new(secret.encode(), signing_input, self.__digest(alg)).digest()
+            if not hmac.compare_digest(expected, _b64decode(signature)):
+                raise InvalidToken("signature verification failed")
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, UnicodeError) as e:
+            raise InvalidToken(str(e)) from e
+        if not isinstance(claims, dict):
+            raise InvalidToken("claims must be an object")
+        exp = claims.get("exp")
+        if exp is not None and (not isinstance(exp, (int, float)) or exp <= time.time()):
+            raise InvalidToken("token has expired")
+        return claims
+
+
+backends = {
+    "jose": JoseBackend,
+    "pyjwt": PyJWTBackend,
+    "hmac": HMACBackend,
+}
+
+
+class Revocations:
+    # revoked keys until they expire, never evicted early: a revocation that was dropped would
+    # make its tokens valid again
+    def __init__(self, clock=time.time):
+        self.__entries: dict[Hashable, tuple[float, float]] = {}  # key -> (value, expires)
+        self.__expiry: list[tuple[float, int, Hashable]] = []
+        self.__sequence = 0
+        self.__clock = clock
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __purge(self, now: float):
+        while self.__expiry and self.__expiry[0][0] <= now:
+            _, _, key = heappop(self.__expiry)
+            entry = self.__entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self.__entries[key]
+
+    def add(self, key: Hashable, ttl: float, value: float = 0.0):
+        now = self.__clock()
+        self.__purge(now)
+        if ttl <= 0:
+            return
+        expires = now + ttl
+        current = self.__entries.get(key)
+        if current is not None and current[1] > expires:
+            expires = current[1]
+        self.__entries[key] = (value, expires)
+        self.__sequence += 1
+        heappush(self.__expiry, (expires, self.__sequence, key))
+
+    def get(self, key: Hashable) -> float | None:
+        entry = self.__entries.get(key)
+        if entry is None or entry[1] <= self.__clock():
+            return None
+        return entry[0]
 
 
 class JWTEncoder:
     def __init__(self, cfg: dict) -> None:
         self.__cfg = cfg
+        self.__backend = backends[cfg.get("JWT_BACKEND") or "jose"]()
+        cache_size = int(cfg.get("JWT_CACHE_SIZE") or 10000)
+        self.__verified = TTLCache(cache_size) if cache_size > 0 else None
+        self.__revoked = Revocations()
+        self.__revoked_users = Revocations()
 
 
     def encode(self, username: str, id: int, expires_delta: timedelta):
-        return jwt.encode({
-            "sub": username, 
+        now = int(time.time())
+        return self.__backend.encode({
+            "sub": username,
             "id": id,
-            "exp": datetime.utcnow() + expires_delta
+            "iat": now,
+            "exp": now + int(expires_delta.total_seconds())
             }, self.__cfg["JWT_SECRET"], self.__cfg["JWT_ALG"])
 
-    def decode_token(self, token: str) -> dict |None:
+    def warmup(self):
+        # the first token sets up the backend, e.g. imports the crypto backends of jose
+        self.__verify(self.encode("warmup", 0, timedelta(minutes=1)))
+
+    @staticmethod
+    def __key(token: str) -> bytes:
+        return blake2b(token.encode(), digest_size=16).digest()
+
+    def __verify(self, token: str) -> dict | None:
         try:
-            payload = jwt.decode(token, self.__cfg["JWT_SECRET"], algorithms=[self.__cfg["JWT_ALG"]])
-            if any(x not in payload for x in ["sub", "id", "exp"]):
+            payload = self.__backend.decode(token, self.__cfg["JWT_SECRET"], self.__cfg["JWT_ALG"])
+        except InvalidToken:
+            return None
+        if any(x not in payload for x in ["sub", "id", "exp"]):
+            return None
+        if not _timestamp(payload["exp"]) or ("iat" in payload and not _timestamp(payload["iat"])):
+            return None
+        if not isinstance(payload["id"], (int, str)):
+            return None
+        return payload
+
+    def decode_token(self, token: str) -> dict |None:
+        key = self.__key(token)
+        if self.__revoked.get(key) is not None:
+            return None
+        hit = self.__verified.get(key) if self.__verified is not None else None
+        if hit is not None:
+            payload = hit[0]
+        else:
+            payload = self.__verify(token)
+            if payload is None:
                 return None
-            return payload
-        except JWTError:
+            if self.__verified is not None:
+                self.__verified.set(key, payload, payload["exp"] - time.time())
+        revoked_at = self.__revoked_users.get(payload["id"])
+        if revoked_at is not None and payload.get("iat", 0) <= revoked_at:
+            return None
+        return payload
+
+    def revoke(self, token: str):
+        key = self.__key(token)
+        if self.__verified is not None:
+            self.__verified.delete(key)
+        payload = self.__verify(token)
+        if payload is not None:
+            self.__revoked.add(key, payload["exp"] - time.time())
+
+    def revoke_user(self, id: int):
+        # rejects every token issued to the user up to now, for as long as such a token could live
+        lifetime = float(self.__cfg.get("EXPIRE") or 1) * 86400
+        self.__revoked_users.add(id, lifetime, time.time())
+
+    def cache_stats(self) -> dict | None:
+        if self.__verified is None:
             return None
+        return self.__verified.stats()
@@ -0,0 +1,158 @@
+from typing import Literal
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class Endpoint:
+    __slots__ = ("dest", "url", "outstanding", "requests", "failures", "healthy", "check_failures", "ejected_until", "ejections", "recovered_at")
+
+    def __init__(self, dest: str):
+        self.dest = dest
+        self.url = httpx.URL(dest)
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.healthy = True
+        self.check_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.recovered_at = float("-inf")
+
+
+class Balancer:
+    # client-side balancing over the replicas of one service: endpoints are taken out by active
+    # health checks and by passive ejection after consecutive failures, and get their share of
+    # traffic back gradually over `slow_start` seconds
+    def __init__(self,
+                 strategy: Literal["p2c", "least"] = "p2c",
+                 health_path: str | None = None,
+                 health_interval: float = 10.0,
+                 health_timeout: float = 2.0,
+                 health_fall: int = 2,
+                 eject_failures: int = 5,
+                 eject_time: float = 30.0,
+                 slow_start: float = 30.0,
+                 clock=time.monotonic,
+                 ):
+        self.__strategy = strategy
+        self.__health_path = health_path
+        self.__health_interval = health_interval
+        self.__health_timeout = health_timeout
+        self.__health_fall = health_fall
+        self.__eject_failures = eject_failures
+        self.__eject_time = eject_time
+        self.__slow_start = slow_start
+        self.__clock = clock
+        self.__endpoints: list[Endpoint] = []
+        self.__checks: asyncio.Task | None = None
+
+    @property
+    def endpoints(self) -> list[Endpoint]:
+        return self.__endpoints
+
+    def add(self, dest: str):
+        self.__endpoints.append(Endpoint(dest))
+
+    def __available(self, endpoint: Endpoint, now: float) -> bool:
+        if endpoint.ejected_until:
+            if now < endpoint.ejected_until:
+                return False
+            endpoint.recovered_at = endpoint.ejected_until
+            endpoint.ejected_until = 0.0
+        return endpoint.healthy
+
+    def __weight(self, endpoint: Endpoint, now: float) -> float:
+        if self.__slow_start <= 0:
+            return 1.0
+        return min(1.0, max(0.1, (now - endpoint.recovered_at) / self.__slow_start))
+
+    def __score(self, endpoint: Endpoint, now: float) -> float:
+        return (endpoint.outstanding + 1) / self.__weight(endpoint, now)
+
+    def pick(self) -> Endpoint:
+        now = self.__clock()
+        candidates = [e for e in self.__endpoints if self.__available(e, now)]
+        if not candidates:
+            # every replica is out, spreading the load beats refusing it
+            candidates = self.__endpoints
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.__strategy == "least":
+            best = min(self.__score(e, now) for e in candidates)
+            return random.choice([e for e in candidates if self.__score(e, now) == best])
+        a, b = random.sample(candidates, 2)
+        return a if self.__score(a, now) <= self.__score(b, now) else b
+
+    def started(self, endpoint: Endpoint):
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+
+    def finished(self, endpoint: Endpoint, ok: bool | None):
+        # ok is None for requests that neither succeeded nor failed, e.g. cancelled ones
+        endpoint.outstanding -= 1
+        if ok is None:
+            return
+        if ok:
+            endpoint.failures = 0
+            return
+        endpoint.failures += 1
+        if endpoint.failures >= self.__eject_failures and not endpoint.ejected_until:
+            endpoint.ejections += 1
+            endpoint.failures = 0
+            endpoint.ejected_until = self.__clock() + self.__eject_time * min(endpoint.ejections, 10)
+            logger.warning("ejected %s after %d consecutive failures", endpoint.dest, self.__eject_failures)
+
+    def start(self, client: httpx.AsyncClient):
+        if self.__health_path is not None and self.__checks is None:
+            self.__checks = asyncio.create_task(self.__run_checks(client))
+
+    async def stop(self):
+        checks, self.__checks = self.__checks, None
+        if checks is not None:
+            checks.cancel()
+            try:
+                await checks
+            except asyncio.CancelledError:
+                pass
+
+    async def __run_checks(self, client: httpx.AsyncClient):
+        while True:
+            await asyncio.gather(*(self.__check(client, e) for e in self.__endpoints))
+            await asyncio.sleep(self.__health_interval)
+
+    async def __check(self, client: httpx.AsyncClient, endpoint: Endpoint):
+        try:
+            res = await client.get(endpoint.dest + self.__health_path, timeout=self.__health_timeout)
+            ok = res.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        if ok:
+            endpoint.check_failures = 0
+            if not endpoint.healthy:
+                endpoint.healthy = True
+                endpoint.recovered_at = self.__clock()
+                logger.warning("%s is healthy again", endpoint.dest)
+        else:
+            endpoint.check_failures += 1
+            if endpoint.healthy and endpoint.check_failures >= self.__health_fall:
+                endpoint.healthy = False
+                logger.warning("%s failed %d health checks", endpoint.dest, endpoint.check_failures)
+
+    def stats(self) -> list[dict]:
+        now = self.__clock()
+        return [{
+            "dest": e.dest,
+            "available": self.__available(e, now),
+            "healthy": e.healthy,
+            "ejected": bool(e.ejected_until),
+            "weight": self.__weight(e, now),
+            "outstanding": e.outstanding,
+            "requests": e.requests,
+            "ejections": e.ejections,
+        } for e in self.__endpoints]
@@ -0,0 +1,131 @@
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+import asyncio
+import json
+import logging
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from starlette.exceptions import HTTPException
+from starlette.types import ASGIApp, Message, Scope
+
+from .Metrics import detach
+from . import Compression
+from .schema import BatchItem
+
+logger = logging.getLogger(__name__)
+
+
+class BatchResult:
+    __slots__ = ("index", "id", "status_code", "content", "is_json")
+
+    def __init__(self, index: int, id: str | int | None, status_code: int, content: bytes, is_json: bool):
+        self.index = index
+        self.id = id
+        self.status_code = status_code
+        self.content = content
+        self.is_json = is_json
+
+    def render(self) -> bytes:
+        # JSON bodies are embedded as they are, without decoding them first
+        if not self.content:
+            body = b"null"
+        elif self.is_json:
+            body = self.content
+        else:
+            body = json.dumps(self.content.decode(errors="replace")).encode()
+        id = json.dumps(self.id if self.id is not None else self.index).encode()
+        return b'{"id":' + id + b',"status":' + str(self.status_code).encode() + b',"body":' + body + b"}"
+
+
+class Batch:
+    # runs sub-requests in-process through `app`, normally the router so that the middleware
+    # stack is not run again for every item, with at most `concurrency` of them in flight
+    def __init__(self, app: ASGIApp, concurrency: int = 8):
+        self.__app = app
+        self.__concurrency = concurrency
+
+    async def run(self, parent: Scope, items: list[BatchItem], headers: list[tuple[bytes, bytes]]) -> AsyncIterator[BatchResult]:
+        # yields results in the order they complete
+        semaphore = asyncio.Semaphore(self.__concurrency)
+
+        async def run_one(index: int, item: BatchItem) -> BatchResult:
+            detach()
+            Compression.detach()
+            async with semaphore:
+                return await self.__dispatch(parent, index, item, headers)
+
+        tasks = [asyncio.ensure_future(run_one(index, item)) for index, item in enumerate(items)]
+        try:
+            for next in asyncio.as_completed(tasks):
+                yield await next
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def __dispatch(self, parent: Scope, index: int, item: BatchItem, headers: list[tuple[bytes, bytes]]) -> BatchResult:
+        url = urlsplit(item.path)
+        if url.path == parent["path"]:
+            return self.__error(index, item, 400, "Batches cannot be nested")
+        body = json.dumps(item.body).encode() if item.body is not None else b""
+        if body:
+            headers = headers + [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        scope = {
+            "type": "http",
+            "asgi": parent.get("asgi", {"version": "3.0"}),
+            "http_version": parent.get("http_version", "1.1"),
+            "scheme": parent.get("scheme", "http"),
+            "server": parent.get("server"),
+            "client": parent.get("client"),
+            "root_path": parent.get("root_path", ""),
+            "app": parent.get("app"),
+            "method": item.method.upper(),
+            "path": url.path,
+            "raw_path": url.path.encode(),
+            "query_string": url.query.encode(),
+            "headers": headers,
+        }
+
+        done = asyncio.Event()
+        received = False
+        status_code = 500
+        content_type = b""
+        chunks = []
+
+        async def receive() -> Message:
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # streaming responses listen for a disconnect while they send
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: Message):
+            nonlocal status_code, content_type
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                for key, value in message.get("headers", []):
+                    if key == b"content-type":
+                        content_type = value
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    done.set()
+
+        try:
+            await self.__app(scope, receive, send)
+        except HTTPException as e:
+            return self.__error(index, item, e.status_code, e.detail)
+        except RequestValidationError as e:
+            return self.__error(index, item, 422, jsonable_encoder(e.errors()))
+        except Exception:
+            logger.exception("batch item %s %s failed", item.method, item.path)
+            return self.__error(index, item, 500, "Internal Server Error")
+        finally:
+            done.set()
+        return BatchResult(index, item.id, status_code, b"".join(chunks), content_type.startswith(b"application/json"))
+
+    @staticmethod
+    def __error(index: int, item: BatchItem, status_code: int, detail) -> BatchResult:
+        return BatchResult(index, item.id, status_code, json.dumps({"detail": detail}).encode(), True)
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from typing import Hashable, Any
+from urllib.parse import parse_qsl, urlencode
+import re
+import time
+
+
+class _Entry:
+    __slots__ = ("value", "fresh_until", "stale_until", "size")
+
+    def __init__(self, value: Any, fresh_until: float, stale_until: float, size: int):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.size = size
+
+
+class TTLCache:
+    def __init__(self, max_entries: int, max_bytes: int | None = None, clock=time.monotonic):
+        self.__entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self.__max_entries = max_entries
+        self.__max_bytes = max_bytes
+        self.__clock = clock
+        self.__bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def get(self, key: Hashable) -> tuple[Any, bool] | None:
+        entry = self.__entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        now = self.__clock()
+        if now >= entry.stale_until:
+            self.__remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.__entries.move_to_end(key)
+        if now < entry.fresh_until:
+            self.hits += 1
+            return entry.value, True
+        self.stale_hits += 1
+        return entry.value, False
+
+    def set(self, key: Hashable, value: Any, ttl: float, stale: float = 0.0, size: int = 1):
+        if self.__max_bytes is not None and size > self.__max_bytes:
+            self.delete(key)
+            return
+        if key in self.__entries:
+            self.__remove(key)
+        now = self.__clock()
+        self.__entries[key] = _Entry(value, now + ttl, now + ttl + stale, size)
+        self.__bytes += size
+        while len(self.__entries) > self.__max_entries or (self.__max_bytes is not None and self.__bytes > self.__max_bytes):
+            oldest = next(iter(self.__entries))
+            self.__remove(oldest)
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        if key in self.__entries:
+            self.__remove(key)
+
+    def clear(self):
+        self.__entries.clear()
+        self.__bytes = 0
+
+    def __remove(self, key: Hashable):
+        self.__bytes -= self.__entries.pop(key).size
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.__entries),
+            "bytes": self.__bytes,
+            "max_entries": self.__max_entries,
+            "max_bytes": self.__max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class CacheRule:
+    def __init__(self, pattern: str, ttl: float, stale: float = 0.0):
+        self.pattern = re.compile(pattern)
+        self.ttl = ttl
+        self.stale = stale
+
+
+class CachedResponse:
+    __slots__ = ("status_code", "content", "headers", "encoded", "etag")
+
+    def __init__(self, status_code: int, content: bytes, headers: dict[str, str]):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        # compressed copies of content by content-encoding, made on first use
+        self.encoded: dict[str, bytes] = {}
+        # the upstream's ETag, or one computed from content when first needed
+        self.etag: str | None = headers.get("etag")
+
+
+class ResponseCache:
+    def __init__(self, rules: list[CacheRule], max_entries: int = 1024, max_bytes: int | None = 16 * 1024 * 1024):
+        self.__rules = rules
+        self.__store = TTLCache(max_entries, max_bytes)
+
+    def add_rule(self, rule: CacheRule):
+        self.__rules.append(rule)
+
+    def rule(self, endpoint: str) -> CacheRule | None:
+        for rule in self.__rules:
+            if rule.pattern.match(endpoint):
+                return rule
+        return None
+
+    @staticmethod
+    def key(method: str, endpoint: str) -> str:
+        path, _, query = endpoint.partition("?")
+        if query:
+            path += "?" + urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+        return method.upper() + " " + path
+
+    def get(self, key: str) -> tuple[CachedResponse, bool] | None:
+        return self.__store.get(key)
+
+    def set(self, key: str, response: CachedResponse, rule: CacheRule):
+        self.__store.set(key, response, rule.ttl, rule.stale, len(key) + len(response.content))
+
+    def invalidate(self, key: str | None = None):
+        if key is None:
+            self.__store.clear()
+        else:
+            self.__store.delete(key)
+
+    def stats(self) -> dict:
+        return self.__store.stats()
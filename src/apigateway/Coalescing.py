@@ -0,0 +1,94 @@
+from typing import Awaitable, Callable, Hashable, TypeVar
+import asyncio
+
+T = TypeVar("T")
+
+
+class FlightAborted(Exception):
+    # the leader of a flight gave up without a result, followers should send their own request
+    pass
+
+
+class _Flight:
+    __slots__ = ("future", "task", "waiters")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.task: asyncio.Task | None = None
+        self.waiters = 0
+
+
+def _settle(future: asyncio.Future, task: asyncio.Task):
+    if future.done():
+        return
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+class SingleFlight:
+    # at most one call per key is in flight, callers asking for the same key meanwhile
+    # wait for its result instead of making their own call
+    def __init__(self):
+        self.__flights: dict[Hashable, _Flight] = {}
+        self.__calls = 0
+        self.__shared = 0
+
+    def __start(self, key: Hashable) -> _Flight:
+        flight = self.__flights[key] = _Flight(asyncio.get_running_loop().create_future())
+        flight.future.add_done_callback(lambda _: self.__drop(key, flight))
+        self.__calls += 1
+        return flight
+
+    def __drop(self, key: Hashable, flight: _Flight):
+        if self.__flights.get(key) is flight:
+            del self.__flights[key]
+
+    async def __wait(self, key: Hashable, flight: _Flight):
+        # shielded so that a cancelled caller leaves without cancelling the call for the others
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.future)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and flight.task is not None and not flight.future.done():
+                # nobody is left to use the result, later callers start a new flight
+                self.__drop(key, flight)
+                flight.task.cancel()
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        flight = self.__flights.get(key)
+        if flight is None:
+            flight = self.__start(key)
+            flight.task = asyncio.ensure_future(call())
+            flight.task.add_done_callback(lambda task: _settle(flight.future, task))
+        else:
+            self.__shared += 1
+        return await self.__wait(key, flight)
+
+    def lead(self, key: Hashable) -> asyncio.Future | None:
+        # for callers that produce the result themselves, e.g. while streaming it: returns the
+        # future the caller must resolve, or None if another caller leads and follow() applies
+        if key in self.__flights:
+            return None
+        return self.__start(key).future
+
+    async def follow(self, key: Hashable):
+        flight = self.__flights.get(key)
+        if flight is None:
+            raise FlightAborted()
+        self.__shared += 1
+        return await self.__wait(key, flight)
+
+    @staticmethod
+    def abort(future: asyncio.Future, error: BaseException | None = None):
+        if not future.done():
+            future.set_exception(error if error is not None else FlightAborted())
+            # retrieved here so that a flight without followers is not reported as unhandled
+            future.exception()
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self.__flights), "calls": self.__calls, "shared": self.__shared}
@@ -0,0 +1,58 @@
+from typing import Hashable, Iterable
+import asyncio
+import json
+
+from .Service import Service, ResponseType
+from .Cache import TTLCache
+
+
+class BatchLoader:
+    def __init__(self,
+                 service: Service,
+                 endpoint: str,
+                 key: str = "id",
+                 chunk_size: int = 100,
+                 cache: TTLCache | None = None,
+                 ttl: float = 600.0,
+                 ):
+        self.__service = service
+        self.__endpoint = endpoint
+        self.__key = key
+        self.__chunk_size = chunk_size
+        self.__cache = cache
+        self.__ttl = ttl
+
+    async def load(self, ids: Iterable[Hashable]) -> dict[Hashable, dict]:
+        found: dict[Hashable, dict] = {}
+        missing = []
+        for id in dict.fromkeys(ids):
+            hit = self.__cache.get(id) if self.__cache is not None else None
+            if hit is None:
+                missing.append(id)
+            else:
+                found[id] = hit[0]
+        if not missing:
+            return found
+
+        chunks = [missing[i:i + self.__chunk_size] for i in range(0, len(missing), self.__chunk_size)]
+        batches = await asyncio.gather(*(
+            self.__service.request("post", self.__endpoint, list, ResponseType.PRIM, json.dumps(chunk))
+            for chunk in chunks
+        ))
+        for batch in batches:
+            for obj in batch:
+                id = obj[self.__key]
+                found[id] = obj
+                if self.__cache is not None:
+                    self.__cache.set(id, obj, self.__ttl)
+        return found
+
+    def stats(self) -> dict | None:
+        if self.__cache is None:
+            return None
+        return self.__cache.stats()
+
+
+def join(items: Iterable[dict], key: str, index: dict[Hashable, dict], target: str):
+    for item in items:
+        item[target] = index.get(item[key])
@@ -0,0 +1,257 @@
+from contextvars import ContextVar
+from typing import Callable
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+
+_compressible = ("application/json", "application/x-ndjson", "text/", "application/javascript", "application/xml")
+
+# streamed as the items become ready, every chunk is flushed to the client as it is compressed
+_incremental = ("application/x-ndjson", "text/event-stream")
+
+
+class _BrotliStream:
+    __slots__ = ("compressor",)
+
+    def __init__(self, level: int):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data)
+
+    def sync(self) -> bytes:
+        return self.compressor.flush()
+
+    def flush(self) -> bytes:
+        return self.compressor.finish()
+
+
+class _ZstdStream:
+    __slots__ = ("compressor",)
+
+    def __init__(self, zstd):
+        self.compressor = zstd.compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def sync(self) -> bytes:
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush()
+
+
+class _GzipStream:
+    __slots__ = ("compressor",)
+
+    def __init__(self, level: int):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def sync(self) -> bytes:
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush()
+
+
+class Codec:
+    # `stream` returns an object with compress(chunk), sync() that returns everything compressed
+    # so far, and flush() that ends the stream
+    __slots__ = ("name", "compress", "stream")
+
+    def __init__(self, name: str, compress: Callable[[bytes], bytes], stream: Callable[[], object]):
+        self.name = name
+        self.compress = compress
+        self.stream = stream
+
+
+def codecs(levels: dict[str, int] | None = None) -> list[Codec]:
+    # in order of preference, only the ones whose library is installed
+    levels = {**DEFAULT_LEVELS, **(levels or {})}
+    found = []
+    if zstandard is not None:
+        zstd = zstandard.ZstdCompressor(level=levels["zstd"])
+        found.append(Codec("zstd", zstd.compress, lambda: _ZstdStream(zstd)))
+    if brotli is not None:
+        found.append(Codec("br", lambda data: brotli.compress(data, quality=levels["br"]), lambda: _BrotliStream(levels["br"])))
+
+    def gzip(data: bytes) -> bytes:
+        stream = zlib.compressobj(levels["gzip"], zlib.DEFLATED, 31)
+        return stream.compress(data) + stream.flush()
+    found.append(Codec("gzip", gzip, lambda: _GzipStream(levels["gzip"])))
+    return found
+
+
+class Accepted:
+    # the encoding negotiated for the current request, for handlers that keep compressed bodies
+    __slots__ = ("codec", "scope", "middleware")
+
+    def __init__(self, codec: Codec, scope: Scope, middleware: "CompressionMiddleware"):
+        self.codec = codec
+        self.scope = scope
+        self.middleware = middleware
+
+    def applies(self, size: int, content_type: str) -> bool:
+        return self.middleware.applies(self.scope, size, content_type)
+
+
+_accepted: ContextVar[Accepted | None] = ContextVar("accepted", default=None)
+
+def accepted() -> Accepted | None:
+    return _accepted.get()
+
+def detach():
+    # for responses that are not sent to the client as they are, e.g. batch items
+    _accepted.set(None)
+
+
+def _suffixed(tag: str, name: str) -> str:
+    # a compressed representation needs its own strong ETag
+    return tag[:-1] + "-" + name + '"' if tag.endswith('"') else tag
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 500, levels: dict[str, int] | None = None, exclude: set[str] | None = None) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.codecs = codecs(levels)
+        # route names, filled in as routes are added
+        self.exclude = exclude if exclude is not None else set()
+        self.__negotiated: dict[str, Codec | None] = {}
+
+    def negotiate(self, accept_encoding: str) -> Codec | None:
+        codec = self.__negotiated.get(accept_encoding, False)
+        if codec is not False:
+            return codec
+        weights = {}
+        for part in accept_encoding.split(","):
+            name, _, params = part.strip().partition(";")
+            q = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            weights[name.strip().lower()] = q
+        codec, best = None, 0.0
+        for candidate in self.codecs:
+            q = weights.get(candidate.name, weights.get("*", 0.0))
+            if q > best:
+                codec, best = candidate, q
+        if len(self.__negotiated) < 256:
+            self.__negotiated[accept_encoding] = codec
+        return codec
+
+    def applies(self, scope: Scope, size: int | None, content_type: str) -> bool:
+        if size is not None and size < self.minimum_size:
+            return False
+        if not content_type.startswith(_compressible):
+            return False
+        route = scope.get("route")
+        return route is None or getattr(route, "name", None) not in self.exclude
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codec = self.negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if codec is None:
+            await self.app(scope, receive, send)
+            return
+
+        # validators the client got for compressed responses are passed on without the suffix,
+        # the inner app only knows the ETag of the uncompressed body
+        suffix = "-" + codec.name + '"'
+        if_none_match = None
+        for i, (key, value) in enumerate(scope["headers"]):
+            if key == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+                if suffix in if_none_match:
+                    scope["headers"] = list(scope["headers"])
+                    scope["headers"][i] = (key, if_none_match.replace(suffix, '"').encode("latin-1"))
+                break
+
+        token = _accepted.set(Accepted(codec, scope, self))
+        start: Message | None = None
+        stream = None
+        incremental = False
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start, stream, incremental, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                if message["status"] == 304 and if_none_match is not None:
+                    headers = MutableHeaders(scope=message)
+                    tag = headers.get("etag")
+                    if tag is not None and _suffixed(tag, codec.name) in if_none_match:
+                        headers["ETag"] = _suffixed(tag, codec.name)
+                        if "accept-encoding" not in headers.get("vary", "").lower():
+                            headers.add_vary_header("Accept-Encoding")
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            if stream is not None:
+                body = stream.compress(message.get("body", b""))
+                more_body = message.get("more_body", False)
+                if not more_body:
+                    body += stream.flush()
+                elif incremental:
+                    body += stream.sync()
+                if body or not more_body:
+                    await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+
+            # first body message, decide whether to compress
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            headers = MutableHeaders(scope=start)
+            length = headers.get("content-length")
+            size = len(body) if not more_body else int(length) if length is not None else None
+            if headers.get("content-encoding") == codec.name and "etag" in headers:
+                # compressed by the handler, e.g. from a cache entry
+                headers["ETag"] = _suffixed(headers["etag"], codec.name)
+            if "content-encoding" in headers or start["status"] in (204, 304) or not self.applies(scope, size, headers.get("content-type", "")):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            headers.add_vary_header("Accept-Encoding")
+            headers["Content-Encoding"] = codec.name
+            if "etag" in headers:
+                headers["ETag"] = _suffixed(headers["etag"], codec.name)
+            if more_body:
+                del headers["Content-Length"]
+                stream = codec.stream()
+                incremental = headers.get("content-type", "").startswith(_incremental)
+                body = stream.compress(body)
+                if incremental:
+                    body += stream.sync()
+            else:
+                body = codec.compress(body)
+                headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _accepted.reset(token)
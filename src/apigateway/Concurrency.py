@@ -0,0 +1,186 @@
+from contextvars import ContextVar
+from heapq import heapify, heappop, heappush
+from itertools import count
+from typing import Literal
+import asyncio
+import math
+
+from fastapi import HTTPException, status
+
+from .Metrics import metrics
+
+metrics.describe("upstream_shed_total", "Upstream requests rejected with 503 by the concurrency limit")
+metrics.describe("upstream_concurrency_limit", "Current adaptive limit on requests in flight to a service")
+metrics.describe("upstream_requests_queued", "Requests waiting for the concurrency limit of a service")
+
+Priority = Literal["interactive", "normal", "batch"]
+
+# lower values are admitted first
+PRIORITIES: dict[str, int] = {"interactive": 0, "normal": 1, "batch": 2}
+
+_priority: ContextVar[int] = ContextVar("priority", default=PRIORITIES["normal"])
+
+def priority() -> int:
+    return _priority.get()
+
+def prioritize(level: Priority):
+    # upstream requests made by the current request are queued with this priority
+    _priority.set(PRIORITIES[level])
+
+
+# fewest latency samples the gradient limit averages before it moves
+_min_window = 10
+
+
+class ConcurrencyLimit:
+    # an adaptive limit on the requests in flight to one upstream, learned from their latency:
+    #   gradient  scales the limit by long-term / short-term latency once per window of samples,
+    #             so it shrinks as soon as requests queue up at the upstream and grows by
+    #             sqrt(limit) while they don't
+    #   aimd      grows by 1/limit per success and shrinks by `backoff` per failure or timeout
+    # requests over the limit wait in a bounded priority queue, and are shed with 503 when it
+    # is full or they waited `max_wait` seconds
+    def __init__(self,
+                 name: str,
+                 algorithm: Literal["gradient", "aimd"] = "gradient",
+                 initial: int = 20,
+                 min_limit: int = 2,
+                 max_limit: int = 200,
+                 queue_size: int = 100,
+                 max_wait: float = 1.0,
+                 tolerance: float = 1.5,
+                 smoothing: float = 0.2,
+                 long_window: int = 600,
+                 backoff: float = 0.9,
+                 timeout: float = 5.0,
+                 ):
+        self.name = name
+        self.__algorithm = algorithm
+        self.__limit = float(initial)
+        self.__min_limit = min_limit
+        self.__max_limit = max_limit
+        self.__queue_size = queue_size
+        self.__max_wait = max_wait
+        self.__tolerance = tolerance
+        self.__smoothing = smoothing
+        self.__long_alpha = 2 / (long_window + 1)
+        self.__backoff = backoff
+        self.__timeout = timeout
+        self.__long_rtt = 0.0
+        self.__short_rtt = 0.0
+        self.__samples = 0
+        self.__sample_sum = 0.0
+        self.__dropped = False
+        self.__in_flight = 0
+        self.__queue: list[list] = []  # [priority, sequence, future] entries
+        self.__sequence = count()
+        self.shed = 0
+        self.timeouts = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self.__limit)
+
+    def __shed(self, reason: str) -> HTTPException:
+        self.shed += 1
+        metrics.inc("upstream_shed_total", (("service", self.name), ("reason", reason)))
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service overloaded",
+            headers={"Retry-After": str(max(1, math.ceil(self.__max_wait)))},
+            )
+
+    def __dequeue(self, entry: list):
+        try:
+            self.__queue.remove(entry)
+        except ValueError:
+            return
+        heapify(self.__queue)
+
+    async def acquire(self, priority: int = PRIORITIES["normal"]):
+        if self.__in_flight < self.limit and not self.__queue:
+            self.__in_flight += 1
+            return
+        if len(self.__queue) >= self.__queue_size:
+            worst = max(self.__queue, default=None)
+            if worst is None or worst[0] <= priority:
+                raise self.__shed("queue_full")
+            # a more important request takes the place of the least important one waiting
+            self.__dequeue(worst)
+            worst[2].set_exception(self.__shed("displaced"))
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self.__sequence), future]
+        heappush(self.__queue, entry)
+        try:
+            await asyncio.wait_for(future, self.__max_wait)
+        except asyncio.TimeoutError:
+            self.__dequeue(entry)
+            self.timeouts += 1
+            raise self.__shed("timeout") from None
+        except BaseException:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # admitted just before being cancelled
+                self.release(None, None)
+            else:
+                self.__dequeue(entry)
+            raise
+
+    def release(self, rtt: float | None, ok: bool | None):
+        # ok is None for requests that were cancelled, they say nothing about the upstream
+        self.__in_flight -= 1
+        if ok is not None:
+            self.__update(rtt, ok)
+        while self.__queue and self.__in_flight < self.limit:
+            _, _, future = heappop(self.__queue)
+            if not future.done():
+                self.__in_flight += 1
+                future.set_result(None)
+
+    def __update(self, rtt: float | None, ok: bool):
+        limit = self.__limit
+        # a limit that is not used up has not been tested, so it only grows when it is
+        app_limited = self.__in_flight + 1 < limit / 2
+        if self.__algorithm == "aimd":
+            if not ok or (rtt is not None and rtt > self.__timeout):
+                limit *= self.__backoff
+            elif not app_limited:
+                limit += 1 / limit
+        else:
+            if rtt is not None:
+                self.__samples += 1
+                self.__sample_sum += rtt
+            self.__dropped |= not ok
+            # about one round trip of the whole limit, so a raised limit is measured before it rises again
+            if self.__samples < max(_min_window, self.limit):
+                return
+            self.__short_rtt = self.__sample_sum / self.__samples
+            self.__samples, self.__sample_sum = 0, 0.0
+            dropped, self.__dropped = self.__dropped, False
+            if not self.__long_rtt:
+                self.__long_rtt = self.__short_rtt
+            self.__long_rtt += (self.__short_rtt - self.__long_rtt) * self.__long_alpha
+            if self.__long_rtt > self.__short_rtt * 2:
+                # recovering from overload, forget the congested baseline faster
+                self.__long_rtt *= 0.95
+            if dropped:
+                target = limit * self.__backoff
+            else:
+                gradient = max(0.5, min(1.0, self.__tolerance * self.__long_rtt / self.__short_rtt))
+                target = limit * gradient + math.sqrt(limit)
+                if app_limited and target > limit:
+                    target = limit
+            limit = limit * (1 - self.__smoothing) + target * self.__smoothing
+        self.__limit = max(self.__min_limit, min(self.__max_limit, limit))
+
+    def stats(self) -> dict:
+        return {
+            "algorithm": self.__algorithm,
+            "limit": self.limit,
+            "in_flight": self.__in_flight,
+            "queued": len(self.__queue),
+            "queue_size": self.__queue_size,
+            "shed": self.shed,
+            "timeouts": self.timeouts,
+            "rtt_long": self.__long_rtt,
+            "rtt_short": self.__short_rtt,
+        }
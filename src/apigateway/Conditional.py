@@ -0,0 +1,100 @@
+from hashlib import blake2b
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# the headers a 304 repeats from the 200 it stands for, besides CORS headers
+_not_modified_headers = frozenset([b"etag", b"cache-control", b"content-location", b"date", b"expires", b"vary"])
+
+
+def etag(content: bytes) -> str:
+    return '"' + blake2b(content, digest_size=16).hexdigest() + '"'
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def none_match(if_none_match: str, tag: str) -> bool:
+    # weak comparison, as If-None-Match requires
+    if if_none_match.strip() == "*":
+        return True
+    tag = _opaque(tag)
+    return any(_opaque(t.strip()) == tag for t in if_none_match.split(","))
+
+
+def not_modified(start: Message) -> Message:
+    headers = [(k, v) for k, v in start.get("headers", []) if k in _not_modified_headers or k.startswith(b"access-control-")]
+    return {"type": "http.response.start", "status": 304, "headers": headers}
+
+
+class ConditionalMiddleware:
+    # adds a strong ETag to successful GET responses that have none, hashing bodies of up to
+    # `max_size` bytes, and answers a matching If-None-Match with 304 instead of the body
+    def __init__(self, app: ASGIApp, max_size: int = 1024 * 1024) -> None:
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start: Message | None = None
+        chunks: list[bytes] = []
+        size = 0
+        state = "start"  # then "buffer", "pass" or "drop"
+
+        async def send_not_modified():
+            nonlocal state
+            state = "drop"
+            await send(not_modified(start))
+            await send({"type": "http.response.body", "body": b""})
+
+        async def send_wrapper(message: Message):
+            nonlocal start, size, state
+            if message["type"] == "http.response.start":
+                start = message
+                headers = MutableHeaders(scope=message)
+                length = headers.get("content-length")
+                if message["status"] != 200 or headers.get("content-type", "").startswith("text/event-stream"):
+                    state = "pass"
+                elif "etag" in headers:
+                    if if_none_match is not None and none_match(if_none_match, headers["etag"]):
+                        # the body that still follows is dropped
+                        await send_not_modified()
+                        return
+                    state = "pass"
+                elif length is not None and int(length) > self.max_size:
+                    state = "pass"
+                else:
+                    state = "buffer"
+                    return
+                await send(message)
+                return
+            if message["type"] != "http.response.body" or state == "pass":
+                await send(message)
+                return
+            if state == "drop":
+                return
+
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            more_body = message.get("more_body", False)
+            if size > self.max_size:
+                state = "pass"
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": more_body})
+                return
+            if more_body:
+                return
+            content = b"".join(chunks)
+            tag = etag(content)
+            MutableHeaders(scope=start)["ETag"] = tag
+            if if_none_match is not None and none_match(if_none_match, tag):
+                await send_not_modified()
+                return
+            await send(start)
+            await send({"type": "http.response.body", "body": content})
+
+        await self.app(scope, receive, send_wrapper)
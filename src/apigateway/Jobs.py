@@ -0,0 +1,213 @@
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Awaitable, Callable, Literal
+import asyncio
+import json
+import logging
+import secrets
+import time
+
+from fastapi import HTTPException, status
+
+from .Cache import TTLCache
+from .Metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("gateway_jobs_total", "Background jobs by outcome")
+
+JobStatus = Literal["queued", "running", "succeeded", "failed"]
+
+
+class Job:
+    __slots__ = ("id", "key", "owner", "status", "created", "finished", "result", "error")
+
+    def __init__(self, key: str, owner: int | str | None):
+        self.id = secrets.token_urlsafe(16)
+        self.key = key
+        self.owner = owner
+        self.status: JobStatus = "queued"
+        self.created = time.time()
+        self.finished: float | None = None
+        self.result: bytes | None = None  # JSON
+        self.error: tuple[int, str] | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def render(self) -> bytes:
+        # the JSON result is embedded as it is, like the bodies of batch results
+        head = json.dumps({
+            "id": self.id,
+            "status": self.status,
+            "created": self.created,
+            "finished": self.finished,
+            "error": {"status_code": self.error[0], "detail": self.error[1]} if self.error is not None else None,
+        }, separators=(",", ":")).encode()
+        return head[:-1] + b',"result":' + (self.result if self.result is not None else b"null") + b"}"
+
+
+class JobStore(ABC):
+    # jobs by ID, and the queued or running job of every key so that identical requests
+    # share a job; a store shared between workers has to make put() and active() consistent
+    @abstractmethod
+    async def get(self, id: str) -> Job | None:
+        ...
+
+    @abstractmethod
+    async def put(self, job: Job):
+        ...
+
+    @abstractmethod
+    async def active(self, key: str) -> Job | None:
+        ...
+
+
+class MemoryJobStore(JobStore):
+    # per-process, finished jobs are kept for `ttl` seconds and up to `max_jobs` of them;
+    # queued and running jobs are never evicted, the runner's queue bounds their number
+    def __init__(self, max_jobs: int = 10000, ttl: float = 3600, clock=time.monotonic):
+        self.__jobs = TTLCache(max_jobs, clock=clock)
+        self.__pending: dict[str, Job] = {}
+        self.__active: dict[str, str] = {}
+        self.__ttl = ttl
+
+    async def get(self, id: str) -> Job | None:
+        job = self.__pending.get(id)
+        if job is not None:
+            return job
+        hit = self.__jobs.get(id)
+        return hit[0] if hit is not None else None
+
+    async def put(self, job: Job):
+        if job.done:
+            self.__pending.pop(job.id, None)
+            if self.__active.get(job.key) == job.id:
+                del self.__active[job.key]
+            self.__jobs.set(job.id, job, self.__ttl)
+        else:
+            self.__pending[job.id] = job
+            self.__active[job.key] = job.id
+
+    async def active(self, key: str) -> Job | None:
+        id = self.__active.get(key)
+        return self.__pending.get(id) if id is not None else None
+
+
+class JobRunner:
+    # runs submitted calls on `workers` tasks, with at most `queue_size` of them waiting;
+    # a call returns the JSON result of its job or raises HTTPException
+    def __init__(self, store: JobStore | None = None, workers: int = 4, queue_size: int = 100, heartbeat: float = 15.0):
+        self.__store = store if store is not None else MemoryJobStore()
+        self.__workers = workers
+        self.__queue: asyncio.Queue[tuple[Job, Callable[[], Awaitable[bytes]]]] = asyncio.Queue(queue_size)
+        self.__tasks: list[asyncio.Task] = []
+        self.__heartbeat = heartbeat
+        # replaced on every change of a job, so that watchers never miss one
+        self.__changed: dict[str, asyncio.Event] = {}
+        self.running = 0
+        self.deduplicated = 0
+
+    def start(self):
+        if not self.__tasks:
+            self.__tasks = [asyncio.create_task(self.__work()) for _ in range(self.__workers)]
+
+    async def stop(self):
+        tasks, self.__tasks = self.__tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # jobs that never started fail like the running ones
+        while not self.__queue.empty():
+            job, _ = self.__queue.get_nowait()
+            job.error = (status.HTTP_503_SERVICE_UNAVAILABLE, "Gateway shutting down")
+            job.status = "failed"
+            job.finished = time.time()
+            metrics.inc("gateway_jobs_total", (("status", job.status),))
+            await self.__update(job)
+
+    async def submit(self, key: str, owner: int | str | None, call: Callable[[], Awaitable[bytes]]) -> Job:
+        # `key` identifies the request including its owner, a queued or running job with the
+        # same key is returned instead of running it twice
+        job = await self.__store.active(key)
+        if job is not None:
+            self.deduplicated += 1
+            return job
+        if self.__queue.full():
+            metrics.inc("gateway_jobs_total", (("status", "rejected"),))
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many jobs queued",
+                headers={"Retry-After": "5"},
+                )
+        job = Job(key, owner)
+        await self.__store.put(job)
+        self.__queue.put_nowait((job, call))
+        return job
+
+    async def get(self, id: str, owner: int | str | None) -> Job:
+        job = await self.__store.get(id)
+        if job is None or job.owner != owner:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+        return job
+
+    async def watch(self, id: str, owner: int | str | None) -> AsyncIterator[Job | None]:
+        # yields the job whenever it changes until it is done, and None every `heartbeat`
+        # seconds without a change
+        job = await self.get(id, owner)
+        yield job
+        last = job.status
+        while not job.done:
+            changed = self.__changed.setdefault(id, asyncio.Event())
+            job = await self.get(id, owner)
+            if job.status == last:
+                try:
+                    await asyncio.wait_for(changed.wait(), self.__heartbeat)
+                except asyncio.TimeoutError:
+                    # a store shared between workers can change without an event here
+                    yield None
+                    continue
+                job = await self.get(id, owner)
+            if job.status != last:
+                last = job.status
+                yield job
+
+    async def __update(self, job: Job):
+        await self.__store.put(job)
+        changed = self.__changed.pop(job.id, None)
+        if changed is not None:
+            changed.set()
+
+    async def __work(self):
+        while True:
+            job, call = await self.__queue.get()
+            job.status = "running"
+            await self.__update(job)
+            self.running += 1
+            try:
+                job.result = await call()
+                job.status = "succeeded"
+            except HTTPException as e:
+                job.error = (e.status_code, str(e.detail))
+                job.status = "failed"
+            except asyncio.CancelledError:
+                job.error = (status.HTTP_503_SERVICE_UNAVAILABLE, "Gateway shutting down")
+                job.status = "failed"
+                raise
+            except Exception:
+                logger.exception("job %s failed", job.id)
+                job.error = (status.HTTP_500_INTERNAL_SERVER_ERROR, "Job failed")
+                job.status = "failed"
+            finally:
+                self.running -= 1
+                job.finished = time.time()
+                metrics.inc("gateway_jobs_total", (("status", job.status),))
+                await self.__update(job)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.__workers,
+            "queued": self.__queue.qsize(),
+            "running": self.running,
+            "deduplicated": self.deduplicated,
+        }
@@ -0,0 +1,84 @@
+# production entry point: python -m apigateway [APP] or the apigateway script
+import argparse
+import importlib.util
+import logging
+import os
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+
+def cpu_count() -> int:
+    # the CPUs this process may run on, further limited by a cgroup v2 quota inside containers
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            count = min(count, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return count
+
+
+def available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def env(key: str, default=None):
+    return os.environ.get(f"GATEWAY_{key}", default)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="apigateway", description="Run the API gateway with one worker process per core")
+    parser.add_argument("app", nargs="?", default=env("APP", "app.server:app"), help="import string of the ASGI app")
+    parser.add_argument("--host", default=env("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(env("PORT", 7001)))
+    parser.add_argument("--workers", type=int, default=int(env("WORKERS", 0)), help="defaults to the number of usable cores")
+    parser.add_argument("--backlog", type=int, default=int(env("BACKLOG", 2048)), help="listen queue length")
+    parser.add_argument("--keep-alive", type=int, default=int(env("KEEP_ALIVE", 5)), help="seconds an idle client connection is kept open")
+    parser.add_argument("--graceful-timeout", type=int, default=int(env("GRACEFUL_TIMEOUT", 30)), help="seconds in-flight requests get to finish on SIGTERM")
+    parser.add_argument("--limit-concurrency", type=int, default=int(env("LIMIT_CONCURRENCY", 0)) or None, help="connections per worker before answering 503")
+    parser.add_argument("--root-path", default=env("ROOT_PATH", ""))
+    parser.add_argument("--forwarded-allow-ips", default=env("FORWARDED_ALLOW_IPS"))
+    parser.add_argument("--no-access-log", action="store_true", default=env("ACCESS_LOG", "true").lower() != "true")
+    parser.add_argument("--log-level", default=env("LOG_LEVEL", "info"))
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    workers = args.workers or cpu_count()
+    loop = "uvloop" if available("uvloop") else "asyncio"
+    http = "httptools" if available("httptools") else "h11"
+    logging.basicConfig(level=args.log_level.upper())
+    logger.info("starting %d workers on %s:%d with %s and %s", workers, args.host, args.port, loop, http)
+
+    # every worker imports the app once, which reads the configuration and builds the routes;
+    # on SIGTERM each worker stops accepting, drains within the graceful timeout and then runs
+    # the shutdown handlers that close the connection pools of the services
+    uvicorn.run(
+        args.app,
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        lifespan="on",
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        limit_concurrency=args.limit_concurrency,
+        root_path=args.root_path,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        access_log=not args.no_access_log,
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Callable, Iterable
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Receive, Scope, Send, Message
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n > 0:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+
+class Timing:
+    # phases of the current request, reported in the Server-Timing header
+    __slots__ = ("start", "entered", "left", "phases")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.entered = 0.0
+        self.left = 0.0
+        self.phases: list[tuple[str, str | None, float]] = []
+
+    def header(self, now: float) -> str:
+        parts = []
+        if self.entered:
+            parts.append(f"validate;dur={(self.entered - self.start) * 1000:.2f}")
+        for name, desc, seconds in self.phases:
+            if desc is None:
+                parts.append(f"{name};dur={seconds * 1000:.2f}")
+            else:
+                parts.append(f'{name};desc="{desc}";dur={seconds * 1000:.2f}')
+        if self.left:
+            parts.append(f"serialize;dur={(now - self.left) * 1000:.2f}")
+        parts.append(f"total;dur={(now - self.start) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_timing: ContextVar[Timing | None] = ContextVar("timing", default=None)
+
+def current() -> Timing | None:
+    return _timing.get()
+
+def phase(name: str, seconds: float, desc: str | None = None):
+    timing = _timing.get()
+    if timing is not None:
+        timing.phases.append((name, desc, seconds))
+
+def detach():
+    # for work running concurrently inside a request, e.g. batch items, whose phases would overlap
+    _timing.set(None)
+
+
+class Metrics:
+    def __init__(self):
+        self.__histograms: dict[str, dict[Labels, Histogram]] = {}
+        self.__counters: dict[str, dict[Labels, float]] = {}
+        self.__help: dict[str, str] = {}
+        self.__collectors: list[Callable[[], Iterable[tuple[str, Labels, float]]]] = []
+        self.in_flight = 0
+
+    def describe(self, name: str, help: str):
+        self.__help[name] = help
+
+    def histogram(self, name: str, labels: Labels, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        series = self.__histograms.get(name)
+        if series is None:
+            series = self.__histograms[name] = {}
+        h = series.get(labels)
+        if h is None:
+            h = series[labels] = Histogram(buckets)
+        return h
+
+    def inc(self, name: str, labels: Labels, amount: float = 1):
+        series = self.__counters.get(name)
+        if series is None:
+            series = self.__counters[name] = {}
+        series[labels] = series.get(labels, 0) + amount
+
+    def collector(self, collect: Callable[[], Iterable[tuple[str, Labels, float]]]):
+        # gauges that are read on scrape, e.g. pool usage
+        self.__collectors.append(collect)
+
+    def observe_request(self, method: str, route: str, status_code: int, seconds: float, size: int):
+        labels = (("method", method), ("route", route))
+        self.histogram("gateway_request_duration_seconds", labels).observe(seconds)
+        self.histogram("gateway_response_bytes", labels, SIZE_BUCKETS).observe(size)
+        self.inc("gateway_responses_total", labels + (("status", str(status_code)),))
+
+    def observe_upstream(self, service: str, method: str, status_code: int, seconds: float, size: int | None):
+        labels = (("service", service), ("method", method))
+        self.histogram("upstream_request_duration_seconds", labels).observe(seconds)
+        if size is not None:
+            self.histogram("upstream_response_bytes", (("service", service),), SIZE_BUCKETS).observe(size)
+        self.inc("upstream_responses_total", (("service", service), ("status", str(status_code))))
+
+    def upstream_error(self, service: str, error: str):
+        self.inc("upstream_errors_total", (("service", service), ("error", error)))
+
+    @staticmethod
+    def __labels(labels: Labels, extra: str = "") -> str:
+        parts = [f'{k}="{v}"' for k, v in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        lines = []
+        for name, series in self.__counters.items():
+            lines.append(f"# HELP {name} {self.__help.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{self.__labels(labels)} {value}")
+        for name, series in self.__histograms.items():
+            lines.append(f"# HELP {name} {self.__help.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, h in series.items():
+                cumulative = 0
+                for bound, n in zip(h.bounds, h.counts):
+                    cumulative += n
+                    le = self.__labels(labels, 'le="%s"' % bound)
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                le = self.__labels(labels, 'le="+Inf"')
+                lines.append(f"{name}_bucket{le} {h.count}")
+                lines.append(f"{name}_sum{self.__labels(labels)} {h.sum}")
+                lines.append(f"{name}_count{self.__labels(labels)} {h.count}")
+        gauges: dict[str, list[tuple[Labels, float]]] = {"gateway_requests_in_flight": [((), self.in_flight)]}
+        for collect in self.__collectors:
+            for name, labels, value in collect():
+                gauges.setdefault(name, []).append((labels, value))
+        for name, series in gauges.items():
+            lines.append(f"# HELP {name} {self.__help.get(name, name)}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in series:
+                lines.append(f"{name}{self.__labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def latency(self) -> dict:
+        out = {}
+        for name in ("gateway_request_duration_seconds", "upstream_request_duration_seconds"):
+            for labels, h in self.__histograms.get(name, {}).items():
+                key = " ".join(v for _, v in labels)
+                out.setdefault(name, {})[key] = {
+                    "count": h.count,
+                    "p50": h.quantile(0.50),
+                    "p95": h.quantile(0.95),
+                    "p99": h.quantile(0.99),
+                }
+        return out
+
+
+metrics = Metrics()
+metrics.describe("gateway_request_duration_seconds", "Time from receiving a request to sending the last body chunk")
+metrics.describe("gateway_response_bytes", "Size of response bodies sent to clients")
+metrics.describe("gateway_responses_total", "Responses sent to clients by status")
+metrics.describe("gateway_requests_in_flight", "Requests currently being handled")
+metrics.describe("upstream_request_duration_seconds", "Time from sending an upstream request to receiving its headers")
+metrics.describe("upstream_response_bytes", "Size of upstream response bodies")
+metrics.describe("upstream_responses_total", "Upstream responses by status")
+metrics.describe("upstream_errors_total", "Upstream requests that failed without a response")
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, metrics: Metrics = metrics, server_timing: bool = True) -> None:
+        self.app = app
+        self.metrics = metrics
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = Timing(perf_counter())
+        token = _timing.set(timing)
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    MutableHeaders(scope=message).append("Server-Timing", timing.header(perf_counter()))
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        self.metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.in_flight -= 1
+            _timing.reset(token)
+            route = scope.get("route")
+            self.metrics.observe_request(scope["method"], route.path if route is not None else "unmatched", status_code, perf_counter() - timing.start, size)
@@ -0,0 +1,78 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import lru_cache
+from typing import Any, Callable
+import binascii
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, Field
+
+NEXT_CURSOR = "X-Next-Cursor"
+
+
+class Pagination(BaseModel):
+    max_limit: int = Field(default=100, description="largest page a client can ask for, and the page size of a cursor without limit")
+    upstream_limit: str | None = Field(default=None, description="query parameter the upstream takes a page size in, if it pages itself")
+    upstream_offset: str | None = Field(default=None, description="query parameter the upstream takes the offset of a page in")
+
+
+def encode_cursor(offset: int) -> str:
+    return urlsafe_b64encode(f"o{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        value = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        if value[:1] == "o" and value[1:].isdigit():
+            return int(value[1:])
+    except (binascii.Error, UnicodeDecodeError):
+        pass
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+@lru_cache(maxsize=256)
+def projector(fields: str) -> Callable[[Any], Any]:
+    # "id,dateStamp,weight" keeps only those keys of every object; unknown names are ignored
+    keys = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+
+    def project(value: Any) -> Any:
+        if isinstance(value, dict):
+            return {k: value[k] for k in keys if k in value}
+        return value
+    return project
+
+
+class PageRequest:
+    # the page a client asked for, resolved against the route's Pagination
+    __slots__ = ("offset", "limit", "project", "query", "start")
+
+    def __init__(self, pagination: Pagination, limit: int | None, cursor: str | None, fields: str | None):
+        self.offset = decode_cursor(cursor) if cursor is not None else 0
+        self.limit = limit if limit is not None else pagination.max_limit if cursor is not None else None
+        self.project = projector(fields) if fields else None
+        # upstream query for the page plus one item, to know whether there is a next one
+        self.query = None
+        self.start = self.offset
+        if self.limit is not None and pagination.upstream_limit is not None:
+            if pagination.upstream_offset is not None:
+                self.query = f"{pagination.upstream_limit}={self.limit + 1}&{pagination.upstream_offset}={self.offset}"
+                self.start = 0
+            else:
+                self.query = f"{pagination.upstream_limit}={self.offset + self.limit + 1}"
+
+    def url(self, path: str) -> str:
+        if self.query is None:
+            return path
+        return path + ("&" if "?" in path else "?") + self.query
+
+    def apply(self, data: Any) -> tuple[Any, str | None]:
+        # returns the page and the cursor of the next one
+        if not isinstance(data, list):
+            return (self.project(data) if self.project is not None else data), None
+        next_cursor = None
+        if self.limit is not None:
+            if len(data) > self.start + self.limit:
+                next_cursor = encode_cursor(self.offset + self.limit)
+            data = data[self.start:self.start + self.limit]
+        if self.project is not None:
+            data = [self.project(item) for item in data]
+        return data, next_cursor
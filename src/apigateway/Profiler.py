@@ -0,0 +1,95 @@
+from types import FrameType
+import sys
+import threading
+import time
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class Sampler:
+    # statistical profiler: a thread samples the stack of the event loop thread every `interval`
+    # seconds and counts identical stacks, which folded() renders in the format of
+    # flamegraph.pl and speedscope ("outer;inner;innermost count" per line)
+    def __init__(self, interval: float = 0.005, max_stacks: int = 10000):
+        self.__interval = interval
+        self.__max_stacks = max_stacks
+        self.__stacks: dict[str, int] = {}
+        self.__thread: threading.Thread | None = None
+        self.__stop = threading.Event()
+        self.__started = 0.0
+        self.__ended: float | None = None
+        self.__until: float | None = None
+        self.samples = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self, interval: float | None = None, duration: float | None = None, target: int | None = None):
+        # samples the calling thread unless `target` is given, and stops by itself after `duration`
+        self.stop()
+        if interval is not None:
+            self.__interval = interval
+        self.__stacks = {}
+        self.samples = self.dropped = 0
+        self.__started = time.monotonic()
+        self.__ended = None
+        self.__until = self.__started + duration if duration is not None else None
+        self.__stop.clear()
+        self.__thread = threading.Thread(
+            target=self.__run,
+            args=(target if target is not None else threading.get_ident(),),
+            name="profiler",
+            daemon=True,
+        )
+        self.__thread.start()
+
+    def stop(self):
+        thread, self.__thread = self.__thread, None
+        if thread is not None:
+            self.__stop.set()
+            thread.join()
+
+    def __run(self, target: int):
+        try:
+            self.__sample(target)
+        finally:
+            self.__ended = time.monotonic()
+
+    def __sample(self, target: int):
+        while not self.__stop.wait(self.__interval):
+            if self.__until is not None and time.monotonic() >= self.__until:
+                return
+            frame = sys._current_frames().get(target)
+            if frame is None:
+                return
+            labels = []
+            while frame is not None:
+                labels.append(_label(frame))
+                frame = frame.f_back
+            stack = ";".join(reversed(labels))
+            self.samples += 1
+            if stack in self.__stacks:
+                self.__stacks[stack] += 1
+            elif len(self.__stacks) < self.__max_stacks:
+                self.__stacks[stack] = 1
+            else:
+                self.dropped += 1
+
+    def folded(self) -> str:
+        stacks = dict(self.__stacks)
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(stacks.items(), key=lambda item: -item[1]))
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "interval": self.__interval,
+            "seconds": (self.__ended or time.monotonic()) - self.__started if self.__started else 0.0,
+            "samples": self.samples,
+            "stacks": len(self.__stacks),
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,98 @@
+from abc import ABC, abstractmethod
+from typing import Literal
+import math
+import time
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, Field
+
+from .Cache import TTLCache
+from .Metrics import metrics
+
+metrics.describe("gateway_rate_limited_total", "Requests rejected with 429 by route")
+
+
+class Quota(BaseModel):
+    limit: int = Field(description="requests per period, the sustained rate of a token bucket")
+    period: float = Field(default=1.0, description="seconds")
+    algorithm: Literal["token_bucket", "sliding_window"] = "token_bucket"
+    burst: int | None = Field(default=None, description="token bucket capacity, defaults to limit")
+    key: Literal["user", "ip"] = Field(default="user", description="unauthenticated requests are always keyed on the client IP")
+
+    @classmethod
+    def parse(cls, value: str, **kwargs) -> "Quota":
+        # "100/60" is 100 requests per 60 seconds
+        limit, _, period = value.partition("/")
+        return cls(limit=int(limit), period=float(period or 1), **kwargs)
+
+
+class RateStore(ABC):
+    # both calls return 0 when the request is admitted, otherwise the seconds until it would be;
+    # a store shared between workers has to apply them atomically, e.g. as a Redis script
+    @abstractmethod
+    async def token_bucket(self, key: str, rate: float, burst: float) -> float:
+        ...
+
+    @abstractmethod
+    async def sliding_window(self, key: str, limit: int, period: float) -> float:
+        ...
+
+
+class MemoryStore(RateStore):
+    # per-process state, keys that have recovered their full quota expire from the LRU
+    def __init__(self, max_keys: int = 100000, clock=time.monotonic):
+        self.__state = TTLCache(max_keys, clock=clock)
+        self.__clock = clock
+
+    async def token_bucket(self, key: str, rate: float, burst: float) -> float:
+        now = self.__clock()
+        hit = self.__state.get(key)
+        tokens = burst
+        if hit is not None:
+            last_tokens, updated = hit[0]
+            tokens = min(burst, last_tokens + (now - updated) * rate)
+        if tokens < 1.0:
+            return (1.0 - tokens) / rate
+        tokens -= 1.0
+        self.__state.set(key, (tokens, now), (burst - tokens) / rate)
+        return 0.0
+
+    async def sliding_window(self, key: str, limit: int, period: float) -> float:
+        # two fixed windows, the previous one weighted by how much of it still overlaps the sliding window
+        now = self.__clock()
+        window = math.floor(now / period)
+        elapsed = now - window * period
+        previous = current = 0
+        hit = self.__state.get(key)
+        if hit is not None:
+            last_window, last_previous, last_current = hit[0]
+            if last_window == window:
+                previous, current = last_previous, last_current
+            elif last_window == window - 1:
+                previous = last_current
+        if current >= limit:
+            return period - elapsed
+        if previous * (1 - elapsed / period) + current + 1 > limit:
+            # the previous window has to slide out far enough to make room for one more
+            return max(0.0, period * (1 - (limit - current - 1) / previous) - elapsed) if previous else period - elapsed
+        self.__state.set(key, (window, previous, current + 1), 2 * period - elapsed)
+        return 0.0
+
+
+class RateLimiter:
+    def __init__(self, store: RateStore | None = None):
+        self.__store = store if store is not None else MemoryStore()
+
+    async def check(self, route: str, quota: Quota, key: str):
+        store_key = f"{route}:{key}"
+        if quota.algorithm == "token_bucket":
+            wait = await self.__store.token_bucket(store_key, quota.limit / quota.period, quota.burst or quota.limit)
+        else:
+            wait = await self.__store.sliding_window(store_key, quota.limit, quota.period)
+        if wait > 0:
+            metrics.inc("gateway_rate_limited_total", (("route", route),))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+                )
@@ -0,0 +1,138 @@
+from enum import Enum
+from typing import Callable
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+RETRY_STATUSES = frozenset([502, 503, 504])
+
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_time: float = 30.0, half_open_max: int = 1, clock=time.monotonic):
+        self.name = name
+        self.__failure_threshold = failure_threshold
+        self.__recovery_time = recovery_time
+        self.__half_open_max = half_open_max
+        self.__clock = clock
+        self.__state = BreakerState.CLOSED
+        self.__failures = 0
+        self.__opened_at = 0.0
+        self.__trials = 0
+        self.__transitions = 0
+        self.__listeners: list[Callable[[str, BreakerState, BreakerState], None]] = []
+
+    def on_transition(self, listener: Callable[[str, BreakerState, BreakerState], None]):
+        self.__listeners.append(listener)
+
+    def __transition(self, state: BreakerState):
+        old, self.__state = self.__state, state
+        self.__transitions += 1
+        if state is BreakerState.OPEN:
+            self.__opened_at = self.__clock()
+        self.__trials = 0
+        logger.warning("circuit breaker %s: %s -> %s", self.name, old.value, state.value)
+        for listener in self.__listeners:
+            listener(self.name, old, state)
+
+    @property
+    def state(self) -> BreakerState:
+        if self.__state is BreakerState.OPEN and self.__clock() - self.__opened_at >= self.__recovery_time:
+            self.__transition(BreakerState.HALF_OPEN)
+        return self.__state
+
+    def retry_after(self) -> float:
+        return max(0.0, self.__recovery_time - (self.__clock() - self.__opened_at))
+
+    def allow(self) -> bool:
+        state = self.state
+        if state is BreakerState.CLOSED:
+            return True
+        if state is BreakerState.HALF_OPEN and self.__trials < self.__half_open_max:
+            self.__trials += 1
+            return True
+        return False
+
+    def record_success(self):
+        self.__failures = 0
+        if self.__state is BreakerState.HALF_OPEN:
+            self.__transition(BreakerState.CLOSED)
+
+    def record_failure(self):
+        self.__failures += 1
+        if self.__state is BreakerState.HALF_OPEN or (self.__state is BreakerState.CLOSED and self.__failures >= self.__failure_threshold):
+            self.__transition(BreakerState.OPEN)
+
+    def record_cancelled(self):
+        # a trial that neither succeeded nor failed gives its slot back
+        if self.__state is BreakerState.HALF_OPEN and self.__trials > 0:
+            self.__trials -= 1
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self.__failures,
+            "transitions": self.__transitions,
+            "retry_after": self.retry_after() if self.__state is BreakerState.OPEN else 0.0,
+        }
+
+
+class RetryBudget:
+    # every request deposits `ratio` tokens, every retry withdraws one, and `min_per_sec`
+    # tokens trickle in so that low-traffic services can still retry
+    def __init__(self, ratio: float = 0.2, min_per_sec: float = 10.0, clock=time.monotonic):
+        self.__ratio = ratio
+        self.__min_per_sec = min_per_sec
+        self.__max_tokens = max(min_per_sec, 1.0) * 10
+        self.__tokens = self.__max_tokens
+        self.__clock = clock
+        self.__updated = clock()
+        self.retries = 0
+        self.exhausted = 0
+
+    def __refill(self, amount: float):
+        now = self.__clock()
+        amount += (now - self.__updated) * self.__min_per_sec
+        self.__updated = now
+        self.__tokens = min(self.__max_tokens, self.__tokens + amount)
+
+    def deposit(self):
+        self.__refill(self.__ratio)
+
+    def withdraw(self) -> bool:
+        self.__refill(0.0)
+        if self.__tokens < 1.0:
+            self.exhausted += 1
+            return False
+        self.__tokens -= 1.0
+        self.retries += 1
+        return True
+
+    def stats(self) -> dict:
+        self.__refill(0.0)
+        return {"tokens": self.__tokens, "retries": self.retries, "exhausted": self.exhausted}
+
+
+class RetryPolicy:
+    def __init__(self, attempts: int = 3, backoff: float = 0.05, backoff_max: float = 1.0, budget: RetryBudget | None = None):
+        self.attempts = attempts
+        self.budget = budget
+        self.__backoff = backoff
+        self.__backoff_max = backoff_max
+
+    def delay(self, retry: int) -> float:
+        # full jitter
+        return random.uniform(0, min(self.__backoff_max, self.__backoff * 2 ** retry))
+
+    def should_retry(self, method: str, attempt: int) -> bool:
+        if method not in IDEMPOTENT_METHODS or attempt >= self.attempts:
+            return False
+        return self.budget is None or self.budget.withdraw()
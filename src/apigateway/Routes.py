@@ -0,0 +1,65 @@
+from pydantic import BaseModel, Field
+from typing import Literal
+from urllib.parse import quote
+from string import Formatter
+import os
+
+from .RateLimit import Quota
+from .Concurrency import Priority
+from .Paging import Pagination
+
+DEFAULT_ROUTES = os.path.join(os.path.dirname(__file__), "routes.json")
+
+class Route(BaseModel):
+    name: str
+    method: str
+    path: str
+    service: str
+    upstream: str
+    auth: bool = True
+    params: dict[str, Literal["int", "float", "str"]] = Field(default={}, description="path and query parameters of the gateway route")
+    body: str | None = Field(default=None, description="schema model of the request body")
+    upstream_body: str | None = Field(default=None, description="schema model the body is converted to before it is sent upstream")
+    user: str | None = Field(default=None, description="body field that receives the authenticated user ID")
+    response: Literal["json", "raw", "success", "ok"] = Field(default="json", description="success returns the success field of the upstream response, ok always returns success")
+    response_model: str | None = None
+    status_code: int = 200
+    tags: list[str] = []
+    rate_limit: Quota | None = Field(default=None, description="replaces the default quota of the gateway for this route")
+    compress: bool = True
+    priority: Priority = Field(default="normal", description="order in which requests waiting for an upstream are admitted")
+    job: bool = Field(default=False, description="run the upstream request as a background job and answer 202 with the job")
+    page: Pagination | None = Field(default=None, description="adds limit, cursor and fields parameters to a route that returns a list")
+
+class RouteTable(BaseModel):
+    routes: list[Route]
+
+
+def load_routes(path: str = DEFAULT_ROUTES) -> list[Route]:
+    with open(path) as f:
+        return RouteTable.model_validate_json(f.read()).routes
+
+
+class Template:
+    # "/mealPlan/{planID}/{user_id}" is split once into literals and field names,
+    # rendering is then a single join with the values URL-quoted
+    def __init__(self, template: str):
+        self.__literals: list[str] = []
+        self.__fields: list[str] = []
+        for literal, field, _, _ in Formatter().parse(template):
+            self.__literals.append(literal)
+            if field is not None:
+                self.__fields.append(field)
+        self.__tail = self.__literals.pop() if len(self.__literals) > len(self.__fields) else ""
+
+    @property
+    def fields(self) -> list[str]:
+        return self.__fields
+
+    def render(self, values: dict) -> str:
+        parts = []
+        for literal, field in zip(self.__literals, self.__fields):
+            parts.append(literal)
+            parts.append(quote(str(values[field]), safe=""))
+        parts.append(self.__tail)
+        return "".join(parts)
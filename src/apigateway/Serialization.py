@@ -0,0 +1,75 @@
+from functools import lru_cache
+from typing import Any, Callable, Union, get_args, get_origin
+import types
+
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import PydanticUndefined
+import orjson
+
+Projector = Callable[[Any], Any] | None
+
+
+def _nullable(project: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    return lambda value: None if value is None else project(value)
+
+
+def _projector(tp: Any) -> Projector:
+    # picks the declared fields out of already decoded JSON without validating them,
+    # None where the value can be passed on as it is
+    origin = get_origin(tp)
+    if origin in (list, set, tuple):
+        args = get_args(tp)
+        item = _projector(args[0]) if args else None
+        return None if item is None else _nullable(lambda values: [item(v) for v in values])
+    if origin is Union or origin is types.UnionType:
+        args = [a for a in get_args(tp) if a is not type(None)]
+        if len(args) != 1:
+            return None
+        inner = _projector(args[0])
+        return None if inner is None else _nullable(inner)
+    if isinstance(tp, type) and issubclass(tp, BaseModel):
+        fields = []
+        for name, field in tp.model_fields.items():
+            default = field.default if field.default is not PydanticUndefined and field.default_factory is None else PydanticUndefined
+            fields.append((field.alias or name, _projector(field.annotation), default))
+
+        def project(data: dict) -> dict:
+            out = {}
+            for key, inner, default in fields:
+                if key in data:
+                    value = data[key]
+                    out[key] = value if inner is None or value is None else inner(value)
+                elif default is not PydanticUndefined:
+                    out[key] = default
+            return out
+        return _nullable(project)
+    return None
+
+
+class ResponseAdapter:
+    # compiled once per route: validates the upstream body against `model`, or for trusted
+    # upstreams only projects it onto the fields of `model`, and renders the result
+    def __init__(self, model: Any = Any, trusted: bool = False):
+        self.__trusted = trusted
+        self.__adapter = TypeAdapter(model)
+        self.__project = _projector(model)
+
+    def parse(self, content: bytes) -> Any:
+        if not self.__trusted:
+            return self.__adapter.validate_json(content)
+        data = orjson.loads(content)
+        return data if self.__project is None else self.__project(data)
+
+    def render(self, value: Any, status_code: int = 200) -> Response:
+        if self.__trusted:
+            return Response(orjson.dumps(value), status_code, media_type="application/json")
+        return Response(self.__adapter.dump_json(value), status_code, media_type="application/json")
+
+
+@lru_cache(maxsize=None)
+def parser(res_model: Any, trusted: bool = False) -> Callable[[bytes], Any]:
+    # for Service.request callers that ask for plain dicts and lists or a model type
+    if res_model is None or res_model is dict or res_model is list or res_model is Any:
+        return orjson.loads
+    return ResponseAdapter(res_model, trusted).parse
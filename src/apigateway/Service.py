@@ -1,46 +1,630 @@
-from fastapi import HTTPException
+from fastapi import HTTPException, status
 import httpx
 import asyncio
-from typing import TypeVar, Type
+import json
+import logging
+import math
+from typing import TypeVar, Type, Callable, Awaitable
 from enum import Enum
+from http import HTTPStatus
+from fastapi.responses import Response, StreamingResponse
+
+from .Cache import ResponseCache, CacheRule, CachedResponse, TTLCache
+from .Resilience import CircuitBreaker, RetryPolicy, RETRY_STATUSES
+from .Coalescing import SingleFlight, FlightAborted
+from .Balancer import Balancer, Endpoint
+from .Concurrency import ConcurrencyLimit, priority
+from .Serialization import ResponseAdapter, parser
+from . import Compression
+from .Conditional import etag
+from .Metrics import metrics, phase, current
+from time import perf_counter
 
 T = TypeVar('T')
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
 class ResponseType(Enum):
+    # DICT, LIST, PRIM and JSON all parse the body into res_model, see Serialization.parser
     DICT = 0
     LIST = 1
     PRIM = 2
+    JSON = 3
+    RAW = 4 # forward the upstream body untouched, for routes that don't transform it
+
+# hop-by-hop headers and headers that starlette computes itself
+_skip_headers = frozenset(["connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer", "transfer-encoding", "upgrade", "date", "server"])
+
+# request headers that can change the upstream response, part of the single-flight key
+_vary_headers = ("accept", "accept-encoding", "authorization", "if-none-match", "if-modified-since")
+
+# followers of a streamed flight get the leader's buffered body, larger bodies are not shared
+# or kept for conditional requests
+_max_shared_body = 4 * 1024 * 1024
+
+# upstream headers kept with a response that is served again later
+_stored_headers = ("content-type", "etag", "last-modified")
+
+async def _closed():
+    pass
+
+def _reason(status_code: int) -> str:
+    try:
+        return HTTPStatus(status_code).phrase
+    except ValueError:
+        return "Error"
 
 
 class Service:
-    def __init__(self, dest: str):
-        self.__dest = dest
-        self.__types = {
-            ResponseType.DICT: lambda m, x: m(**x),
-            ResponseType.LIST: lambda m, x: m(*x),
-            ResponseType.PRIM: lambda m, x: m(x)
+    def __init__(self,
+                 dest: str | list[str],
+                 limits: httpx.Limits = DEFAULT_LIMITS,
+                 max_per_host: int | None = None,
+                 http2: bool = False,
+                 transport: httpx.AsyncBaseTransport | None = None,
+                 cache: ResponseCache | None = None,
+                 timeout: httpx.Timeout = DEFAULT_TIMEOUT,
+                 total_timeout: float | None = None,
+                 retry: RetryPolicy | None = None,
+                 breaker: CircuitBreaker | None = None,
+                 name: str | None = None,
+                 coalesce: bool = True,
+                 balancer: Balancer | None = None,
+                 trusted: bool = False,
+                 validators: TTLCache | None = None,
+                 concurrency: ConcurrencyLimit | None = None,
+                 ):
+        # with several replicas, requests are built against the first one and routed per attempt
+        endpoints = [dest] if isinstance(dest, str) else dest
+        self.__dest = endpoints[0]
+        self.__balancer = None
+        if len(endpoints) > 1:
+            self.__balancer = balancer if balancer is not None else Balancer()
+            for endpoint in endpoints:
+                self.__balancer.add(endpoint)
+        self.__name = name or self.__dest
+        self.__limits = limits
+        self.__max_per_host = max_per_host
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.error("HTTP/2 to %s needs the h2 package (pip install httpx[http2]), using HTTP/1.1", self.__name)
+                http2 = False
+        self.__http2 = http2
+        self.__transport = transport
+        self.__client: httpx.AsyncClient | None = None
+        self.__host_slots: dict[bytes, asyncio.Semaphore] = {}
+        self.__in_flight = 0
+        self.__waiting = 0
+        self.__requests = 0
+        self.__cache = cache
+        self.__refreshing: dict[str, asyncio.Task] = {}
+        self.__timeout = timeout
+        self.__total_timeout = total_timeout
+        self.__retry = retry
+        self.__breaker = breaker
+        self.__flights = SingleFlight() if coalesce else None
+        self.__trusted = trusted
+        # last response per GET URL that came with an ETag or Last-Modified, to make the next
+        # request for it conditional
+        self.__validators = validators
+        self.__concurrency = concurrency
+
+    @property
+    def dest(self) -> str:
+        return self.__dest
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def cache(self) -> ResponseCache | None:
+        return self.__cache
+
+    @property
+    def breaker(self) -> CircuitBreaker | None:
+        return self.__breaker
+
+    @property
+    def balancer(self) -> Balancer | None:
+        return self.__balancer
+
+    @property
+    def concurrency(self) -> ConcurrencyLimit | None:
+        return self.__concurrency
+
+    @property
+    def trusted(self) -> bool:
+        # responses of a trusted upstream are projected onto the response models instead of validated
+        return self.__trusted
+
+    async def open(self):
+        if self.__client is not None:
+            return
+        self.__client = httpx.AsyncClient(
+            limits=self.__limits,
+            http2=self.__http2,
+            transport=self.__transport,
+            timeout=self.__timeout,
+            headers={"Content-Type": "application/json"},
+        )
+        if self.__balancer is not None:
+            self.__balancer.start(self.__client)
+
+    async def warmup(self, connections: int = 2, path: str = "/", timeout: float = 2.0):
+        # opens `connections` pooled connections to every upstream with concurrent requests, so that
+        # the first requests after startup don't wait for handshakes; any response will do
+        await self.open()
+        urls = [e.url for e in self.__balancer.endpoints] if self.__balancer is not None else [httpx.URL(self.__dest)]
+
+        async def connect(url: httpx.URL):
+            try:
+                await asyncio.gather(*(self.__client.get(url.join(path), timeout=timeout) for _ in range(connections)))
+            except (OSError, httpx.HTTPError) as e:
+                logger.warning("warming up %s failed: %r", url, e)
+        await asyncio.gather(*(connect(url) for url in urls))
+
+    async def close(self):
+        for task in list(self.__refreshing.values()):
+            task.cancel()
+        if self.__balancer is not None:
+            await self.__balancer.stop()
+        client, self.__client = self.__client, None
+        if client is not None:
+            await client.aclose()
+
+    def __slot(self, url: httpx.URL) -> asyncio.Semaphore | None:
+        if self.__max_per_host is None:
+            return None
+        host = url.netloc
+        slot = self.__host_slots.get(host)
+        if slot is None:
+            slot = self.__host_slots[host] = asyncio.Semaphore(self.__max_per_host)
+        return slot
+
+    async def __acquire(self, req: httpx.Request) -> asyncio.Semaphore | None:
+        slot = self.__slot(req.url)
+        self.__requests += 1
+        if self.__concurrency is not None:
+            await self.__concurrency.acquire(priority())
+        if slot is not None:
+            self.__waiting += 1
+            try:
+                await slot.acquire()
+            except BaseException:
+                if self.__concurrency is not None:
+                    self.__concurrency.release(None, None)
+                raise
+            finally:
+                self.__waiting -= 1
+        self.__in_flight += 1
+        return slot
+
+    def __release(self, slot: asyncio.Semaphore | None, rtt: float | None = None, ok: bool | None = None):
+        # rtt is the time to the response headers, the sample the concurrency limit adapts to
+        self.__in_flight -= 1
+        if slot is not None:
+            slot.release()
+        if self.__concurrency is not None:
+            self.__concurrency.release(rtt, ok)
+
+    def __traced(self, req: httpx.Request, start: float):
+        # only requests that report Server-Timing pay for the trace callback
+        if current() is None:
+            return
+
+        async def trace(event: str, info: dict):
+            if event.endswith("send_request_headers.started"):
+                phase("acquire", perf_counter() - start, self.__name)
+        req.extensions["trace"] = trace
+
+    def __observe(self, req: httpx.Request, res: httpx.Response, start: float, size: int | None):
+        elapsed = perf_counter() - start
+        metrics.observe_upstream(self.__name, req.method, res.status_code, elapsed, size)
+        phase("upstream", elapsed, self.__name)
+
+    def __route(self, req: httpx.Request) -> Endpoint | None:
+        if self.__balancer is None:
+            return None
+        endpoint = self.__balancer.pick()
+        req.url = req.url.copy_with(scheme=endpoint.url.scheme, netloc=endpoint.url.netloc)
+        req.headers["Host"] = endpoint.url.netloc.decode("ascii")
+        self.__balancer.started(endpoint)
+        return endpoint
+
+    def __finished(self, endpoint: Endpoint | None, ok: bool | None):
+        if endpoint is not None:
+            self.__balancer.finished(endpoint, ok)
+
+    async def __dispatch(self, req: httpx.Request) -> tuple[httpx.Response, Callable[[], Awaitable[None]]]:
+        start = perf_counter()
+        endpoint = self.__route(req)
+        self.__traced(req, start)
+        ok = None
+        try:
+            slot = await self.__acquire(req)
+        except BaseException:
+            self.__finished(endpoint, None)
+            raise
+        sent = perf_counter()
+        try:
+            res = await self.__client.send(req)
+            ok = res.status_code < 500
+        except httpx.TransportError as e:
+            metrics.upstream_error(self.__name, type(e).__name__)
+            ok = False
+            raise
+        finally:
+            self.__release(slot, perf_counter() - sent, ok)
+            self.__finished(endpoint, ok)
+        self.__observe(req, res, start, len(res.content))
+        return res, _closed
+
+    async def __dispatch_stream(self, req: httpx.Request) -> tuple[httpx.Response, Callable[[], Awaitable[None]]]:
+        # the connection, host slot and endpoint stay checked out until the returned close() has run
+        start = perf_counter()
+        endpoint = self.__route(req)
+        self.__traced(req, start)
+        try:
+            slot = await self.__acquire(req)
+        except BaseException:
+            self.__finished(endpoint, None)
+            raise
+        sent = perf_counter()
+        try:
+            res = await self.__client.send(req, stream=True)
+        except BaseException as e:
+            ok = None
+            if isinstance(e, httpx.TransportError):
+                metrics.upstream_error(self.__name, type(e).__name__)
+                ok = False
+            self.__release(slot, perf_counter() - sent, ok)
+            self.__finished(endpoint, ok)
+            raise
+        rtt = perf_counter() - sent
+        length = res.headers.get("content-length")
+        self.__observe(req, res, start, int(length) if length is not None else None)
+
+        released = False
+
+        async def close():
+            # the concurrency permit is given back exactly once, however many paths end the body
+            nonlocal released
+            if released:
+                return
+            released = True
+            try:
+                await res.aclose()
+            finally:
+                self.__release(slot, rtt, res.status_code < 500)
+                self.__finished(endpoint, res.status_code < 500)
+        return res, close
+
+    async def __attempts(self, req: httpx.Request, stream: bool) -> tuple[httpx.Response, Callable[[], Awaitable[None]]]:
+        retry, breaker = self.__retry, self.__breaker
+        if retry is not None and retry.budget is not None:
+            retry.budget.deposit()
+        attempt = 1
+        while True:
+            if breaker is not None and not breaker.allow():
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Service unavailable",
+                    headers={"Retry-After": str(math.ceil(breaker.retry_after()))},
+                    )
+            try:
+                res, close = await (self.__dispatch_stream(req) if stream else self.__dispatch(req))
+            except httpx.TransportError as e:
+                if breaker is not None:
+                    breaker.record_failure()
+                if retry is None or not retry.should_retry(req.method, attempt):
+                    timed_out = isinstance(e, httpx.TimeoutException)
+                    raise HTTPException(
+                        status_code=status.HTTP_504_GATEWAY_TIMEOUT if timed_out else status.HTTP_502_BAD_GATEWAY,
+                        detail="Upstream timed out" if timed_out else "Upstream unreachable",
+                        ) from e
+            except BaseException:
+                if breaker is not None:
+                    breaker.record_cancelled()
+                raise
+            else:
+                if breaker is not None:
+                    if res.status_code >= 500:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                if res.status_code not in RETRY_STATUSES or retry is None or not retry.should_retry(req.method, attempt):
+                    return res, close
+                await close()
+            await asyncio.sleep(retry.delay(attempt))
+            attempt += 1
+
+    async def __resilient(self, req: httpx.Request, stream: bool) -> tuple[httpx.Response, Callable[[], Awaitable[None]]]:
+        if self.__total_timeout is None:
+            return await self.__attempts(req, stream)
+        try:
+            return await asyncio.wait_for(self.__attempts(req, stream), self.__total_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Upstream timed out")
+
+    @staticmethod
+    def __flight_key(req: httpx.Request) -> tuple:
+        return (req.method, str(req.url)) + tuple(req.headers.get(h) for h in _vary_headers)
+
+    async def __send(self, req: httpx.Request) -> httpx.Response:
+        if self.__flights is not None and req.method == "GET":
+            return (await self.__flights.do(self.__flight_key(req), lambda: self.__resilient(req, False)))[0]
+        return (await self.__resilient(req, False))[0]
+
+    async def __stream(self, req: httpx.Request) -> tuple[httpx.Response, Callable[[], Awaitable[None]]]:
+        return await self.__resilient(req, True)
+
+    def pool_stats(self) -> dict:
+        connections = []
+        if self.__client is not None:
+            pool = getattr(self.__client._transport, "_pool", None)
+            connections = list(getattr(pool, "connections", []))
+        return {
+            "dest": self.__dest,
+            "open": self.__client is not None,
+            "http2": self.__http2,
+            "max_connections": self.__limits.max_connections,
+            "max_keepalive_connections": self.__limits.max_keepalive_connections,
+            "max_per_host": self.__max_per_host,
+            "connections": len(connections),
+            "idle_connections": sum(1 for c in connections if c.is_idle()),
+            "in_flight": self.__in_flight,
+            "waiting": self.__waiting,
+            "requests": self.__requests,
+            "endpoints": self.__balancer.stats() if self.__balancer is not None else None,
+            "concurrency": self.__concurrency.stats() if self.__concurrency is not None else None,
         }
 
-    async def request(self, 
+    async def __fetch(self, method: str, endpoint: str, data: str = None) -> httpx.Response | CachedResponse:
+        if self.__client is None:
+            await self.open()
+        if self.__cache is not None and method.lower() == "get":
+            rule = self.__cache.rule(endpoint)
+            if rule is not None:
+                return await self.__cached(endpoint, rule)
+        req = self.__client.build_request(method, self.__dest + endpoint, data=data)
+        key, stored = self.__conditional(req)
+        res = await self.__send(req)
+        if stored is not None and res.status_code == 304:
+            return stored
+        if key is not None and self.__has_validators(res):
+            self.__remember(key, CachedResponse(res.status_code, res.content, self.__kept_headers(res)))
+        return res
+
+    def __conditional(self, req: httpx.Request) -> tuple[tuple | None, CachedResponse | None]:
+        if self.__validators is None or req.method != "GET":
+            return None, None
+        key = self.__flight_key(req)
+        hit = self.__validators.get(key)
+        if hit is None:
+            return key, None
+        stored = hit[0]
+        self.__add_validators(req.headers, stored)
+        return key, stored
+
+    @staticmethod
+    def __add_validators(headers: httpx.Headers | dict, stored: CachedResponse):
+        if "etag" in stored.headers:
+            headers["If-None-Match"] = stored.headers["etag"]
+        if "last-modified" in stored.headers:
+            headers["If-Modified-Since"] = stored.headers["last-modified"]
+
+    @staticmethod
+    def __has_validators(res: httpx.Response) -> bool:
+        return res.status_code == 200 and ("etag" in res.headers or "last-modified" in res.headers)
+
+    @staticmethod
+    def __kept_headers(res: httpx.Response) -> dict[str, str]:
+        headers = {k: res.headers[k] for k in _stored_headers if k in res.headers}
+        headers.setdefault("content-type", "application/json")
+        return headers
+
+    def __remember(self, key: tuple, stored: CachedResponse):
+        if len(stored.content) <= _max_shared_body:
+            self.__validators.set(key, stored, float("inf"), size=len(stored.content))
+
+    async def __cached(self, endpoint: str, rule: CacheRule) -> CachedResponse:
+        key = self.__cache.key("get", endpoint)
+        hit = self.__cache.get(key)
+        if hit is not None:
+            res, fresh = hit
+            if not fresh and key not in self.__refreshing:
+                task = asyncio.create_task(self.__revalidate(key, endpoint, rule, res))
+                self.__refreshing[key] = task
+                task.add_done_callback(lambda _: self.__refreshing.pop(key, None))
+            return res
+        return await self.__refresh(key, endpoint, rule)
+
+    async def __revalidate(self, key: str, endpoint: str, rule: CacheRule, stale: CachedResponse):
+        try:
+            await self.__refresh(key, endpoint, rule, stale)
+        except Exception:
+            logger.warning("revalidating %s%s failed, serving stale entry", self.__dest, endpoint, exc_info=True)
+
+    async def __refresh(self, key: str, endpoint: str, rule: CacheRule, stale: CachedResponse | None = None) -> CachedResponse:
+        headers = {}
+        if stale is not None:
+            self.__add_validators(headers, stale)
+        res = await self.__send(self.__client.build_request("get", self.__dest + endpoint, headers=headers))
+        if stale is not None and res.status_code == 304:
+            # unchanged upstream, the stale entry is fresh again without transferring the body
+            self.__cache.set(key, stale, rule)
+            return stale
+        cached = CachedResponse(res.status_code, res.content, self.__kept_headers(res))
+        if res.status_code == 200:
+            self.__cache.set(key, cached, rule)
+        return cached
+
+    def resilience_stats(self) -> dict:
+        return {
+            "breaker": self.__breaker.stats() if self.__breaker is not None else None,
+            "retry_budget": self.__retry.budget.stats() if self.__retry is not None and self.__retry.budget is not None else None,
+            "coalescing": self.__flights.stats() if self.__flights is not None else None,
+        }
+
+    def cache_stats(self) -> dict | None:
+        if self.__cache is None:
+            return None
+        return self.__cache.stats()
+
+    @staticmethod
+    def __raise_for_status(status_code: int, content: bytes):
+        if status_code in range(400, 599):
+            # proxies and load balancers in front of a service answer 502-504 with HTML
+            try:
+                err = json.loads(content)
+            except ValueError:
+                err = None
+            if isinstance(err, dict):
+                detail = err.get("detail", None)
+                if detail is None:
+                    detail = err.get("title", "Error")
+            else:
+                detail = _reason(status_code)
+            raise HTTPException(
+                status_code=status_code,
+                detail=detail
+                )
+
+    async def __forward(self, method: str, endpoint: str, data: str = None) -> Response:
+        if self.__client is None:
+            await self.open()
+        if self.__cache is not None and method.lower() == "get":
+            rule = self.__cache.rule(endpoint)
+            if rule is not None:
+                cached = await self.__cached(endpoint, rule)
+                self.__raise_for_status(cached.status_code, cached.content)
+                return self.__cached_response(cached)
+
+        # identity encoding so the body can be passed on as-is to any client
+        req = self.__client.build_request(method, self.__dest + endpoint, data=data, headers={"Accept-Encoding": "identity"})
+        validated = self.__conditional(req)
+        if self.__flights is None or req.method != "GET":
+            return await self.__pass_through(req, None, validated)
+        key = self.__flight_key(req)
+        flight = self.__flights.lead(key)
+        if flight is not None:
+            return await self.__pass_through(req, flight, validated)
+        try:
+            shared: CachedResponse = await self.__flights.follow(key)
+        except FlightAborted:
+            return await self.__pass_through(req, None, validated)
+        self.__raise_for_status(shared.status_code, shared.content)
+        return self.__cached_response(shared)
+
+    @staticmethod
+    def __cached_response(cached: CachedResponse) -> Response:
+        # hot cache entries are compressed once per encoding instead of on every hit,
+        # and their ETag is computed once
+        if cached.etag is None:
+            cached.etag = etag(cached.content)
+        headers = {"ETag": cached.etag}
+        if "last-modified" in cached.headers:
+            headers["Last-Modified"] = cached.headers["last-modified"]
+        content_type = cached.headers.get("content-type", "application/json")
+        accepted = Compression.accepted()
+        if accepted is None or not accepted.applies(len(cached.content), content_type):
+            return Response(cached.content, cached.status_code, headers=headers, media_type=content_type)
+        name = accepted.codec.name
+        body = cached.encoded.get(name)
+        if body is None:
+            body = cached.encoded[name] = accepted.codec.compress(cached.content)
+        headers["Content-Encoding"] = name
+        headers["Vary"] = "Accept-Encoding"
+        return Response(body, cached.status_code, headers=headers, media_type=content_type)
+
+    async def __pass_through(self, req: httpx.Request, flight: asyncio.Future | None, validated: tuple[tuple | None, CachedResponse | None]) -> Response:
+        # streams the upstream body to the client, and buffers it when leading a flight for the
+        # requests that joined meanwhile, or to keep it for the next conditional request
+        key, stored = validated
+        try:
+            res, close = await self.__stream(req)
+        except HTTPException as e:
+            if flight is not None:
+                SingleFlight.abort(flight, e)
+            raise
+        except BaseException:
+            if flight is not None:
+                SingleFlight.abort(flight)
+            raise
+        if stored is not None and res.status_code == 304:
+            await close()
+            if flight is not None:
+                flight.set_result(stored)
+            return self.__cached_response(stored)
+        headers = {k: v for k, v in res.headers.items() if k not in _skip_headers}
+        if res.status_code in range(400, 599):
+            try:
+                content = await res.aread()
+                if flight is not None:
+                    flight.set_result(CachedResponse(res.status_code, content, headers))
+                self.__raise_for_status(res.status_code, content)
+            finally:
+                if flight is not None:
+                    SingleFlight.abort(flight)
+                await close()
+        remember = key is not None and self.__has_validators(res)
+        # cleanup runs when the body ends, however it ends: starlette skips a background task when
+        # the upstream fails mid-body or the client goes away
+        if flight is None and not remember:
+            async def relay():
+                try:
+                    async for chunk in res.aiter_raw():
+                        yield chunk
+                finally:
+                    await close()
+            return StreamingResponse(relay(), res.status_code, headers=headers)
+
+        async def body():
+            try:
+                chunks, size = [], 0
+                async for chunk in res.aiter_raw():
+                    if chunks is not None:
+                        size += len(chunk)
+                        if size > _max_shared_body:
+                            chunks = None
+                            if flight is not None:
+                                SingleFlight.abort(flight)
+                        else:
+                            chunks.append(chunk)
+                    yield chunk
+                if chunks is not None:
+                    shared = CachedResponse(res.status_code, b"".join(chunks), headers)
+                    if flight is not None and not flight.done():
+                        flight.set_result(shared)
+                    if remember:
+                        self.__remember(key, shared)
+            finally:
+                # the body may not have been complete
+                if flight is not None:
+                    SingleFlight.abort(flight)
+                await close()
+        return StreamingResponse(body(), res.status_code, headers=headers)
+
+    async def request(self,
                       method: str,
                       endpoint: str,
-                      res_model: Type[T],
+                      res_model: Type[T] | ResponseAdapter,
                       res_type: ResponseType=ResponseType.DICT,
                       data: str = None,
-                      ) -> T:
-        async with httpx.AsyncClient() as client:
-            req = client.build_request(method, self.__dest + endpoint, data=data, headers= {"Content-Type": "application/json"})
-            res = (await asyncio.gather(client.send(req)))[0]
+                      ) -> T | Response:
+        if res_type is ResponseType.RAW:
+            return await self.__forward(method, endpoint, data)
+        res = await self.__fetch(method, endpoint, data)
 
-            if res.status_code in range(400, 599):
-                err: dict = res.json()
-                detail = err.get("detail", None)
-                if detail is None:
-                    detail = err.get("title", "Error")
-                raise HTTPException(
-                    status_code=res.status_code, 
-                    detail=detail
-                    )
-            if res.content == b'': # handle responses with no json in body
-                raise HTTPException(res.status_code)
-            return self.__types[res_type](res_model, res.json())
+        self.__raise_for_status(res.status_code, res.content)
+        if res.content == b'': # handle responses with no json in body
+            raise HTTPException(res.status_code)
+        if isinstance(res_model, ResponseAdapter):
+            return res_model.parse(res.content)
+        return parser(res_model, self.__trusted)(res.content)
@@ -0,0 +1,3 @@
+from .Launcher import main
+
+main()
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import date, datetime
-from typing import Optional
+from typing import Any, Optional
 from typing import List
 
 # user service
@@ -125,4 +125,15 @@ class Energy(BaseModel):
 class Ingredient(BaseModel):
     amount: float
     unit: str
-    item: str
\ No newline at end of file
+    item: str
+
+# gateway
+class BatchItem(BaseModel):
+    id: Optional[str | int] = Field(default=None, description="echoed in the result, defaults to the position in the batch")
+    method: str = Field(default="GET", examples=["GET"])
+    path: str = Field(examples=["/recipe/1"])
+    body: Any = None
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
+    stream: bool = Field(default=False, description="return results as NDJSON in the order they complete")
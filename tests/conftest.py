@@ -0,0 +1,76 @@
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import httpx
+import pytest
+
+from apigateway import APIGateway, Service
+from apigateway.Authentication import JWTEncoder
+from apigateway.Routes import load_routes
+from benchmarks.stubs import SERVICES, stub_app
+
+CFG = {
+    "JWT_SECRET": "secret",
+    "JWT_ALG": "HS256",
+    "JWT_BACKEND": "hmac",
+    "EXPIRE": "1",
+    "WARMUP": "false",
+    "METRICS": "false",
+}
+
+
+def json_response(status_code: int, body, headers: dict | None = None) -> httpx.Response:
+    # a streamed body like the one of a real connection, json= bodies cannot be read twice
+    return httpx.Response(status_code, headers={"content-type": "application/json", **(headers or {})},
+                          stream=httpx.ByteStream(httpx.Response(200, json=body).content))
+
+
+@contextmanager
+def gateway(transports: dict[str, httpx.AsyncBaseTransport] | None = None,
+            services: dict[str, Service] | None = None,
+            **cfg) -> Iterator[TestClient]:
+    # every service answers from the stub app of benchmarks/stubs.py unless given a transport or a Service
+    transports = transports or {}
+    services = services or {}
+    cfg = {**CFG, **cfg}
+    app = FastAPI()
+    gateway = APIGateway(app, cfg, JWTEncoder(cfg), {
+        name: services.get(name) or Service(
+            f"http://{name}",
+            transport=transports.get(name) or httpx.ASGITransport(app=stub_app(name, 0, 3)),
+            name=name,
+        )
+        for name in SERVICES
+    }, ["http://client"])
+    gateway.configure_routes(load_routes())
+    with TestClient(app) as client:
+        yield client
+
+
+def login(client: TestClient) -> dict:
+    res = client.post("/login", data={"username": "alice", "password": "secret"})
+    assert res.status_code == 200, res.text
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+@pytest.fixture
+def client() -> Iterator[TestClient]:
+    with gateway() as client:
+        yield client
+
+
+@pytest.fixture
+def auth(client) -> dict:
+    return login(client)
+
+
+def handler(responses: dict[str, Callable[[httpx.Request], httpx.Response]]) -> httpx.MockTransport:
+    # routes by path, everything else answers 404
+    def handle(request: httpx.Request) -> httpx.Response:
+        respond = responses.get(request.url.path)
+        if respond is None:
+            return json_response(404, {"detail": "Not Found"})
+        return respond(request)
+    return httpx.MockTransport(handle)
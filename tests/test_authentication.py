@@ -0,0 +1,86 @@
+from datetime import timedelta
+import time
+
+import pytest
+
+from apigateway.Authentication import HMACBackend, JWTEncoder, Revocations
+
+from .conftest import gateway
+
+
+def encoder(cache_size: str) -> JWTEncoder:
+    return JWTEncoder({
+        "JWT_SECRET": "secret",
+        "JWT_ALG": "HS256",
+        "JWT_BACKEND": "hmac",
+        "JWT_CACHE_SIZE": cache_size,
+        "EXPIRE": "1",
+    })
+
+
+@pytest.mark.parametrize("cache_size", ["0", "1", "10000"])
+def test_revoke(cache_size):
+    jwt = encoder(cache_size)
+    token = jwt.encode("alice", 1, timedelta(minutes=5))
+    assert jwt.decode_token(token)["sub"] == "alice"
+    jwt.revoke(token)
+    assert jwt.decode_token(token) is None
+
+
+@pytest.mark.parametrize("cache_size", ["0", "1", "10000"])
+def test_revoke_user(cache_size):
+    jwt = encoder(cache_size)
+    token = jwt.encode("alice", 1, timedelta(minutes=5))
+    other = jwt.encode("bob", 2, timedelta(minutes=5))
+    assert jwt.decode_token(token) is not None
+    jwt.revoke_user(1)
+    assert jwt.decode_token(token) is None
+    assert jwt.decode_token(other) is not None
+
+
+def test_revocations_outlive_cache_size():
+    jwt = encoder("1")
+    tokens = [jwt.encode(f"user{i}", i, timedelta(minutes=5)) for i in range(5)]
+    for i, token in enumerate(tokens):
+        jwt.revoke(token)
+        jwt.revoke_user(i)
+    assert all(jwt.decode_token(token) is None for token in tokens)
+
+
+def test_invalid_token():
+    jwt = encoder("10000")
+    token = jwt.encode("alice", 1, timedelta(minutes=5))
+    assert jwt.decode_token(token[:-2]) is None
+    assert encoder("0").decode_token(token) is not None
+    assert JWTEncoder({"JWT_SECRET": "other", "JWT_ALG": "HS256", "JWT_BACKEND": "hmac"}).decode_token(token) is None
+
+
+def test_revocations_expire():
+    now = [1000.0]
+    revoked = Revocations(clock=lambda: now[0])
+    revoked.add("a", 10)
+    revoked.add("b", 20, 5.0)
+    assert revoked.get("a") == 0.0 and revoked.get("b") == 5.0
+    now[0] += 15
+    assert revoked.get("a") is None and revoked.get("b") == 5.0
+    revoked.add("c", 10)
+    assert len(revoked) == 2
+    now[0] += 10
+    assert revoked.get("b") is None
+
+
+@pytest.mark.parametrize("claims", [
+    {"exp": None},
+    {"exp": "tomorrow"},
+    {"exp": True},
+    {"iat": None},
+    {"iat": "now"},
+    {"id": [1]},
+])
+def test_signed_token_with_malformed_claims_is_rejected(claims):
+    now = time.time()
+    token = HMACBackend().encode({"sub": "alice", "id": 1, "iat": now, "exp": now + 300, **claims}, "secret", "HS256")
+    for cache_size in ("0", "10000"):
+        assert encoder(cache_size).decode_token(token) is None
+    with gateway() as client:
+        assert client.get("/user", headers={"Authorization": f"Bearer {token}"}).status_code == 401
@@ -0,0 +1,135 @@
+import asyncio
+from collections import Counter
+
+import httpx
+
+from apigateway import Service
+from apigateway.Balancer import Balancer
+from apigateway.Resilience import RetryPolicy
+
+from .conftest import json_response
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def balancer(**kwargs) -> Balancer:
+    balancer = Balancer(**kwargs)
+    for dest in ("http://a", "http://b", "http://c"):
+        balancer.add(dest)
+    return balancer
+
+
+def picks(balancer: Balancer, n: int) -> Counter:
+    counts = Counter()
+    for _ in range(n):
+        endpoint = balancer.pick()
+        balancer.started(endpoint)
+        balancer.finished(endpoint, True)
+        counts[endpoint.dest] += 1
+    return counts
+
+
+def test_least_outstanding():
+    lb = balancer(strategy="least", slow_start=0)
+    a, b, c = lb.endpoints
+    lb.started(a)
+    lb.started(b)
+    assert lb.pick() is c
+    lb.started(c)
+    lb.started(c)
+    assert lb.pick() in (a, b)
+
+
+def test_ejection_and_slow_start():
+    clock = Clock()
+    lb = balancer(eject_failures=3, eject_time=30, slow_start=10, clock=clock)
+    a = lb.endpoints[0]
+    for _ in range(3):
+        lb.started(a)
+        lb.finished(a, False)
+    assert a.ejected_until == clock.now + 30
+    assert "http://a" not in picks(lb, 100)
+
+    clock.now += 30
+    # back, but with a small share of the traffic until slow start is over
+    assert picks(lb, 300)["http://a"] < 50
+    clock.now += 10
+    assert picks(lb, 300)["http://a"] > 50
+
+
+def test_successes_reset_failures():
+    lb = balancer(eject_failures=2)
+    a = lb.endpoints[0]
+    for ok in (False, True, False):
+        lb.started(a)
+        lb.finished(a, ok)
+    assert not a.ejected_until
+
+
+def test_all_ejected_still_picks():
+    lb = balancer(eject_failures=1)
+    for endpoint in lb.endpoints:
+        lb.started(endpoint)
+        lb.finished(endpoint, False)
+    assert lb.pick() in lb.endpoints
+
+
+def replicas(down: set[str], **kwargs) -> tuple[Service, Counter]:
+    hosts = Counter()
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        hosts[request.url.host] += 1
+        if request.url.host in down:
+            raise httpx.ConnectError("refused")
+        return json_response(200, {"host": request.url.host})
+    service = Service(["http://a", "http://b"], transport=httpx.MockTransport(handle), coalesce=False,
+                      retry=RetryPolicy(attempts=3, backoff=0), **kwargs)
+    return service, hosts
+
+
+def test_service_spreads_requests():
+    async def run():
+        service, hosts = replicas(set())
+        await asyncio.gather(*(service.request("get", f"/items/{i}", dict) for i in range(40)))
+        await service.close()
+        return hosts
+    hosts = asyncio.run(run())
+    assert hosts["a"] > 5 and hosts["b"] > 5
+
+
+def test_service_ejects_failing_replica():
+    async def run():
+        service, hosts = replicas({"a"}, balancer=Balancer(eject_failures=2, eject_time=60))
+        for i in range(20):
+            assert (await service.request("get", f"/items/{i}", dict))["host"] == "b"
+        await service.close()
+        return hosts
+    hosts = asyncio.run(run())
+    assert hosts["a"] == 2
+
+
+def test_health_checks():
+    async def run():
+        down = {"a"}
+
+        def handle(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/health" and request.url.host in down:
+                return json_response(503, {})
+            return json_response(200, {"host": request.url.host})
+        lb = Balancer(health_path="/health", health_interval=0.01, health_fall=2, slow_start=0)
+        service = Service(["http://a", "http://b"], transport=httpx.MockTransport(handle), coalesce=False, balancer=lb)
+        await service.open()
+        await asyncio.sleep(0.05)
+        assert [e.healthy for e in lb.endpoints] == [False, True]
+        assert {(await service.request("get", f"/items/{i}", dict))["host"] for i in range(10)} == {"b"}
+        down.clear()
+        await asyncio.sleep(0.05)
+        assert [e.healthy for e in lb.endpoints] == [True, True]
+        await service.close()
+    asyncio.run(run())
@@ -0,0 +1,41 @@
+import json
+
+from .conftest import gateway, login
+
+
+def test_batch():
+    with gateway() as client:
+        auth = login(client)
+        res = client.post("/batch", headers=auth, json={"requests": [
+            {"path": "/user"},
+            {"id": "recipe", "path": "/recipe/3"},
+            {"path": "/recipe/x"},
+            {"path": "/nowhere"},
+            {"path": "/batch", "method": "POST", "body": {"requests": []}},
+        ]})
+        assert res.status_code == 200
+        results = res.json()
+        assert [r["id"] for r in results] == [0, "recipe", 2, 3, 4]
+        assert [r["status"] for r in results] == [200, 200, 422, 404, 400]
+        assert results[0]["body"]["username"] == "bench"
+        assert results[1]["body"]["title"] == "recipe 3"
+
+
+def test_batch_requires_token():
+    with gateway() as client:
+        assert client.post("/batch", json={"requests": [{"path": "/recipe/1"}]}).status_code == 401
+
+
+def test_batch_limit():
+    with gateway(BATCH_MAX_REQUESTS="2") as client:
+        res = client.post("/batch", headers=login(client), json={"requests": [{"path": "/recipe/1"}] * 3})
+        assert res.status_code == 413
+
+
+def test_streamed_batch():
+    with gateway() as client:
+        res = client.post("/batch", headers=login(client), json={"stream": True, "requests": [{"path": f"/recipe/{i}"} for i in range(4)]})
+        assert res.headers["content-type"] == "application/x-ndjson"
+        results = [json.loads(line) for line in res.text.splitlines()]
+        assert sorted(r["id"] for r in results) == [0, 1, 2, 3]
+        assert {r["status"] for r in results} == {200}
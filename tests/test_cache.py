@@ -0,0 +1,104 @@
+import asyncio
+
+import httpx
+
+from apigateway import Service
+from apigateway.Cache import CacheRule, ResponseCache, TTLCache
+
+from .conftest import json_response
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_and_stale():
+    clock = Clock()
+    cache = TTLCache(10, clock=clock)
+    cache.set("a", 1, ttl=10, stale=5)
+    assert cache.get("a") == (1, True)
+    clock.now += 12
+    assert cache.get("a") == (1, False)
+    clock.now += 5
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_lru_eviction():
+    cache = TTLCache(2)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, 60)
+    cache.get("a")
+    cache.set("c", 3, 60)
+    assert cache.get("b") is None
+    assert cache.get("a") == (1, True)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_max_bytes():
+    cache = TTLCache(10, max_bytes=10)
+    cache.set("a", 1, 60, size=6)
+    cache.set("b", 2, 60, size=6)
+    assert cache.get("a") is None
+    cache.set("c", 3, 60, size=11)
+    assert cache.get("c") is None
+    assert cache.stats()["bytes"] == 6
+
+
+def test_key_ignores_query_order():
+    assert ResponseCache.key("get", "/api/foods?query=milk&limit=5") == ResponseCache.key("GET", "/api/foods?limit=5&query=milk")
+    assert ResponseCache.key("get", "/api/foods/1") != ResponseCache.key("get", "/api/foods/2")
+
+
+def service(rule: CacheRule, respond) -> tuple[Service, list[httpx.Request]]:
+    sent = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        sent.append(request)
+        return respond(request)
+    return Service("http://food", transport=httpx.MockTransport(handle), cache=ResponseCache([rule])), sent
+
+
+def test_fresh_hits_skip_the_upstream():
+    upstream, sent = service(CacheRule(r"/api/foods/\d+$", ttl=60), lambda request: json_response(200, {"id": 1}))
+
+    async def run():
+        assert await upstream.request("get", "/api/foods/1", dict) == {"id": 1}
+        assert await upstream.request("get", "/api/foods/1", dict) == {"id": 1}
+        await upstream.request("get", "/api/foods/2", dict)
+        await upstream.request("get", "/api/foods?query=milk", dict)
+        await upstream.request("get", "/api/foods?query=milk", dict)
+    asyncio.run(run())
+    assert [request.url.path for request in sent] == ["/api/foods/1", "/api/foods/2", "/api/foods", "/api/foods"]
+
+
+def test_errors_are_not_cached():
+    statuses = iter([500, 200])
+    upstream, sent = service(CacheRule(r"/api/foods/\d+$", ttl=60), lambda request: json_response(next(statuses), {"detail": "x"}))
+
+    async def run():
+        try:
+            await upstream.request("get", "/api/foods/1", dict)
+        except Exception:
+            pass
+        await upstream.request("get", "/api/foods/1", dict)
+    asyncio.run(run())
+    assert len(sent) == 2
+
+
+def test_stale_while_revalidate():
+    versions = iter(range(10))
+    upstream, sent = service(CacheRule(r"/api/foods/\d+$", ttl=0, stale=60), lambda request: json_response(200, {"version": next(versions)}))
+
+    async def run():
+        assert await upstream.request("get", "/api/foods/1", dict) == {"version": 0}
+        # stale, answered from the cache while it is refreshed in the background
+        assert await upstream.request("get", "/api/foods/1", dict) == {"version": 0}
+        await asyncio.sleep(0.01)
+        assert len(sent) == 2
+        assert await upstream.request("get", "/api/foods/1", dict) == {"version": 1}
+    asyncio.run(run())
@@ -0,0 +1,127 @@
+import asyncio
+
+from fastapi import HTTPException
+import httpx
+import pytest
+
+from apigateway import Service
+from apigateway.Coalescing import FlightAborted, SingleFlight
+
+from .conftest import json_response
+
+
+def test_concurrent_calls_share_one_flight():
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.do("k", call) for _ in range(5)), flights.do("other", call))
+        assert results[:5] == [results[0]] * 5
+        assert await flights.do("k", call) == 3
+        assert flights.stats() == {"in_flight": 0, "calls": 3, "shared": 4}
+    asyncio.run(run())
+
+
+def test_errors_are_shared():
+    async def call():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.do("k", call) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+    asyncio.run(run())
+
+
+def test_cancelled_caller_leaves_the_flight_to_the_others():
+    started = cancelled = 0
+
+    async def call():
+        nonlocal started, cancelled
+        started += 1
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            cancelled += 1
+            raise
+        return "done"
+
+    async def run():
+        flights = SingleFlight()
+        first = asyncio.ensure_future(flights.do("k", call))
+        second = asyncio.ensure_future(flights.do("k", call))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+    asyncio.run(run())
+    assert (started, cancelled) == (1, 0)
+
+
+def test_call_is_cancelled_when_every_caller_left():
+    cancelled = False
+
+    async def call():
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    async def run():
+        flights = SingleFlight()
+        callers = [asyncio.ensure_future(flights.do("k", call)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert flights.stats()["in_flight"] == 0
+    asyncio.run(run())
+    assert cancelled
+
+
+def test_aborted_lead():
+    async def run():
+        flights = SingleFlight()
+        future = flights.lead("k")
+        assert flights.lead("k") is None
+        follower = asyncio.ensure_future(flights.follow("k"))
+        await asyncio.sleep(0)
+        SingleFlight.abort(future)
+        with pytest.raises(FlightAborted):
+            await follower
+        with pytest.raises(FlightAborted):
+            await flights.follow("k")
+    asyncio.run(run())
+
+
+def test_service_coalesces_identical_gets():
+    sent = []
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        sent.append(request)
+        await asyncio.sleep(0.01)
+        if request.url.path == "/missing":
+            return json_response(404, {"detail": "missing"})
+        return json_response(200, {"path": request.url.path})
+
+    async def run():
+        upstream = Service("http://upstream", transport=httpx.MockTransport(handle))
+        results = await asyncio.gather(*(upstream.request("get", "/items", dict) for _ in range(4)))
+        assert results == [{"path": "/items"}] * 4
+        errors = await asyncio.gather(*(upstream.request("get", "/missing", dict) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(e, HTTPException) and e.status_code == 404 for e in errors)
+        await asyncio.gather(*(upstream.request("post", "/items", dict, data="{}") for _ in range(2)))
+        await upstream.close()
+    asyncio.run(run())
+    assert [request.method for request in sent] == ["GET", "GET", "POST", "POST"]
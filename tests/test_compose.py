@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+import httpx
+
+from apigateway import Service
+from apigateway.Cache import TTLCache
+from apigateway.Compose import BatchLoader, join
+
+from .conftest import gateway, json_response, login
+
+
+def loader(**kwargs) -> tuple[BatchLoader, list[list[int]]]:
+    batches = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        ids = json.loads(request.content)
+        batches.append(ids)
+        return json_response(200, [{"id": id, "name": f"food {id}"} for id in ids if id != 404])
+    return BatchLoader(Service("http://food", transport=httpx.MockTransport(handle)), "/api/foods/list", **kwargs), batches
+
+
+def test_chunks_and_deduplicates():
+    foods, batches = loader(chunk_size=2)
+    found = asyncio.run(foods.load([1, 2, 1, 3, 404]))
+    assert sorted(found) == [1, 2, 3]
+    assert sorted(map(sorted, batches)) == [[1, 2], [3, 404]]
+
+
+def test_caches_loaded_items():
+    foods, batches = loader(cache=TTLCache(100))
+
+    async def run():
+        await foods.load([1, 2])
+        return await foods.load([2, 3])
+    assert sorted(asyncio.run(run())) == [2, 3]
+    assert batches == [[1, 2], [3]]
+
+
+def test_join():
+    items = [{"foodId": 1}, {"foodId": 9}]
+    join(items, "foodId", {1: {"id": 1}}, "food")
+    assert items == [{"foodId": 1, "food": {"id": 1}}, {"foodId": 9, "food": None}]
+
+
+def test_inventories_join_foods():
+    with gateway() as client:
+        res = client.get("/inventories", headers=login(client))
+        assert res.status_code == 200
+        items = res.json()[0]["items"]
+        assert [item["food"]["id"] for item in items] == [item["foodId"] for item in items]
@@ -0,0 +1,85 @@
+import asyncio
+import zlib
+
+import brotli
+import pytest
+import zstandard
+
+from apigateway.Compression import CompressionMiddleware
+
+DECOMPRESSORS = {
+    "gzip": lambda: zlib.decompressobj(31).decompress,
+    "br": lambda: brotli.Decompressor().process,
+    "zstd": lambda: zstandard.ZstdDecompressor().decompressobj().decompress,
+}
+
+
+def app(content_type: str, chunks: list[bytes]):
+    async def asgi(scope, receive, send):
+        headers = [(b"content-type", content_type.encode())]
+        if len(chunks) == 1:
+            headers.append((b"content-length", str(len(chunks[0])).encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return asgi
+
+
+def call(middleware, accept_encoding: str) -> list[dict]:
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        return {"type": "http.request"}
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(middleware(scope, receive, send))
+    return sent
+
+
+def headers(start: dict) -> dict:
+    return {k.decode(): v.decode() for k, v in start["headers"]}
+
+
+def test_negotiate():
+    middleware = CompressionMiddleware(app("application/json", [b""]))
+    assert middleware.negotiate("gzip, deflate, br, zstd").name == "zstd"
+    assert middleware.negotiate("gzip;q=0.5, br;q=0.8").name == "br"
+    assert middleware.negotiate("zstd;q=0, gzip").name == "gzip"
+    assert middleware.negotiate("*").name == "zstd"
+    assert middleware.negotiate("identity") is None
+    assert middleware.negotiate("") is None
+
+
+@pytest.mark.parametrize("name", DECOMPRESSORS)
+def test_compresses_large_bodies(name):
+    body = b'{"items": [' + b",".join(b'{"id": %d}' % i for i in range(200)) + b"]}"
+    start, message = call(CompressionMiddleware(app("application/json", [body])), name)
+    assert headers(start)["content-encoding"] == name
+    assert headers(start)["vary"] == "Accept-Encoding"
+    assert int(headers(start)["content-length"]) == len(message["body"]) < len(body)
+    assert DECOMPRESSORS[name]()(message["body"]) == body
+
+
+def test_leaves_small_and_binary_bodies_alone():
+    start, message = call(CompressionMiddleware(app("application/json", [b"{}"])), "gzip")
+    assert "content-encoding" not in headers(start)
+    assert message["body"] == b"{}"
+    start, _ = call(CompressionMiddleware(app("image/png", [b"x" * 1000])), "gzip")
+    assert "content-encoding" not in headers(start)
+
+
+@pytest.mark.parametrize("name", DECOMPRESSORS)
+def test_streamed_lines_are_flushed(name):
+    lines = [b'{"index": %d, "status_code": 200, "body": {}}\n' % i for i in range(3)]
+    start, *messages = call(CompressionMiddleware(app("application/x-ndjson", lines + [b""])), name)
+    assert headers(start)["content-encoding"] == name
+    assert "content-length" not in headers(start)
+    decompress = DECOMPRESSORS[name]()
+    received = b""
+    for i, message in enumerate(messages[:len(lines)]):
+        received += decompress(message["body"])
+        # every line can be decoded by the client as soon as its chunk arrives
+        assert received == b"".join(lines[:i + 1])
+    assert not messages[-1]["more_body"]
@@ -0,0 +1,149 @@
+import asyncio
+
+from fastapi import HTTPException
+import httpx
+import pytest
+
+from apigateway import Service
+from apigateway.Concurrency import PRIORITIES, ConcurrencyLimit
+from apigateway.Service import ResponseType
+
+from .conftest import handler
+
+
+def test_queues_over_the_limit_by_priority():
+    async def run():
+        limit = ConcurrencyLimit("upstream", initial=2, min_limit=2, max_limit=2)
+        await limit.acquire()
+        await limit.acquire()
+        admitted = []
+
+        async def wait(name: str, priority: str):
+            await limit.acquire(PRIORITIES[priority])
+            admitted.append(name)
+        waiters = [asyncio.ensure_future(wait(n, p)) for n, p in (("batch", "batch"), ("normal", "normal"), ("interactive", "interactive"))]
+        await asyncio.sleep(0)
+        assert limit.stats()["queued"] == 3
+        for _ in range(3):
+            limit.release(0.01, True)
+            await asyncio.sleep(0)
+        await asyncio.gather(*waiters)
+        assert admitted == ["interactive", "normal", "batch"]
+    asyncio.run(run())
+
+
+def test_sheds_when_the_queue_is_full():
+    async def run():
+        limit = ConcurrencyLimit("upstream", initial=2, min_limit=2, queue_size=1, max_wait=5)
+        await limit.acquire()
+        await limit.acquire()
+        waiting = asyncio.ensure_future(limit.acquire(PRIORITIES["batch"]))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as e:
+            await limit.acquire(PRIORITIES["batch"])
+        assert e.value.status_code == 503
+        assert e.value.headers["Retry-After"] == "5"
+
+        # a more important request takes the place of the waiting batch request
+        interactive = asyncio.ensure_future(limit.acquire(PRIORITIES["interactive"]))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException):
+            await waiting
+        limit.release(0.01, True)
+        await interactive
+        assert limit.shed == 2
+    asyncio.run(run())
+
+
+def test_sheds_after_max_wait():
+    async def run():
+        limit = ConcurrencyLimit("upstream", initial=2, min_limit=2, max_wait=0.01)
+        await limit.acquire()
+        await limit.acquire()
+        with pytest.raises(HTTPException) as e:
+            await limit.acquire()
+        assert e.value.status_code == 503
+        assert limit.stats()["queued"] == 0
+        assert limit.timeouts == 1
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        limit = ConcurrencyLimit("upstream", initial=2, min_limit=2)
+        await limit.acquire()
+        await limit.acquire()
+        waiting = asyncio.ensure_future(limit.acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert limit.stats()["queued"] == 0
+        limit.release(None, None)
+        assert limit.stats()["in_flight"] == 1
+    asyncio.run(run())
+
+
+def run_load(limit: ConcurrencyLimit, rtt, requests: int):
+    # keeps the limit used up, every request reports `rtt(in_flight)`
+    async def run():
+        in_flight = 0
+        for _ in range(requests):
+            while in_flight < limit.limit:
+                await limit.acquire()
+                in_flight += 1
+            limit.release(rtt(in_flight), True)
+            in_flight -= 1
+        for _ in range(in_flight):
+            limit.release(None, None)
+    asyncio.run(run())
+
+
+def test_gradient_shrinks_when_latency_rises():
+    limit = ConcurrencyLimit("upstream", initial=50, max_limit=200)
+    run_load(limit, lambda in_flight: 0.01, 2000)
+    grown = limit.limit
+    assert grown > 50
+    # the upstream saturates at 20 requests, beyond that they queue there
+    run_load(limit, lambda in_flight: 0.01 * max(1, in_flight / 20), 5000)
+    assert limit.limit < grown
+
+
+def test_aimd():
+    async def run():
+        limit = ConcurrencyLimit("upstream", algorithm="aimd", initial=20, backoff=0.5)
+        await limit.acquire()
+        limit.release(0.01, False)
+        assert limit.limit == 10
+        await limit.acquire()
+        limit.release(10.0, True)
+        assert limit.limit == 5
+    asyncio.run(run())
+
+
+class Broken(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield b'{"title": '
+        raise httpx.ReadTimeout("upstream stalled")
+
+
+def test_stream_failing_mid_body_gives_its_permit_back():
+    def broken(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "application/json"}, stream=Broken())
+    limit = ConcurrencyLimit("recipe", initial=2, min_limit=2, max_limit=2, max_wait=0.1)
+    service = Service("http://recipe", transport=handler({"/recipe/1": broken}), name="recipe", concurrency=limit)
+
+    async def run():
+        # more failures than the limit has permits, none of them may keep one
+        for _ in range(5):
+            res = await service.request("GET", "/recipe/1", None, ResponseType.RAW)
+            with pytest.raises(httpx.ReadTimeout):
+                async for _ in res.body_iterator:
+                    pass
+            assert limit.stats()["in_flight"] == 0
+        await limit.acquire()
+        await limit.acquire()
+        limit.release(None, None)
+        limit.release(None, None)
+        assert limit.shed == 0
+        await service.close()
+    asyncio.run(run())
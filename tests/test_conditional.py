@@ -0,0 +1,61 @@
+import asyncio
+
+import httpx
+
+from apigateway import Service
+from apigateway.Cache import TTLCache
+
+from .conftest import gateway, login
+
+
+def test_etag_and_not_modified():
+    with gateway() as client:
+        auth = login(client)
+        res = client.get("/recipe/1", headers=auth)
+        tag = res.headers["etag"]
+        assert res.status_code == 200
+
+        res = client.get("/recipe/1", headers={**auth, "If-None-Match": tag})
+        assert res.status_code == 304
+        assert res.content == b""
+        assert res.headers["etag"] == tag
+        assert client.get("/recipe/2", headers={**auth, "If-None-Match": tag}).status_code == 200
+        assert client.get("/recipe/1", headers={**auth, "If-None-Match": "*"}).status_code == 304
+
+
+def test_compressed_representations_have_their_own_etag():
+    with gateway(COMPRESSION_MIN_SIZE="0") as client:
+        auth = login(client)
+        plain = client.get("/recipe/1", headers={**auth, "Accept-Encoding": "identity"}).headers["etag"]
+        res = client.get("/recipe/1", headers={**auth, "Accept-Encoding": "gzip"})
+        assert res.headers["content-encoding"] == "gzip"
+        assert res.headers["etag"] == plain[:-1] + '-gzip"'
+
+        res = client.get("/recipe/1", headers={**auth, "Accept-Encoding": "gzip", "If-None-Match": res.headers["etag"]})
+        assert res.status_code == 304
+        assert res.headers["etag"] == plain[:-1] + '-gzip"'
+        assert res.headers["vary"].count("Accept-Encoding") == 1
+
+
+def test_only_gets():
+    with gateway() as client:
+        res = client.post("/generate", json={"targets": [1.0], "split_days": [1.0]}, headers=login(client))
+        assert "etag" not in res.headers
+
+
+def test_revalidates_upstream():
+    sent = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        sent.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"etag": '"v1"'})
+        return httpx.Response(200, headers={"etag": '"v1"', "content-type": "application/json"}, stream=httpx.ByteStream(b'{"id": 1}'))
+
+    async def run():
+        upstream = Service("http://upstream", transport=httpx.MockTransport(handle), validators=TTLCache(100))
+        assert await upstream.request("get", "/items/1", dict) == {"id": 1}
+        assert await upstream.request("get", "/items/1", dict) == {"id": 1}
+        await upstream.close()
+    asyncio.run(run())
+    assert sent == [None, '"v1"']
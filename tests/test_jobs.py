@@ -0,0 +1,147 @@
+import asyncio
+import json
+import time
+
+from fastapi import HTTPException
+import pytest
+
+from apigateway.Jobs import Job, JobRunner, JobStore, MemoryJobStore
+
+from .conftest import gateway, login
+
+BODY = {"targets": [1.0], "split_days": [1.0]}
+
+
+def wait_done(client, location: str, headers: dict) -> dict:
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        job = client.get(location, headers=headers).json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_job_lifecycle():
+    with gateway() as client:
+        auth = login(client)
+        res = client.post("/jobs/generate", json=BODY, headers=auth)
+        assert res.status_code == 202
+        location = res.headers["location"]
+        assert location == f"/jobs/{res.json()['id']}"
+        job = wait_done(client, location, auth)
+        assert job["status"] == "succeeded"
+        assert job["result"] == {"success": True}
+        assert job["error"] is None
+
+        # jobs belong to the user that started them
+        assert client.get(location).status_code == 404
+        assert client.get("/jobs/unknown", headers=auth).status_code == 404
+
+
+def test_job_events():
+    with gateway() as client:
+        auth = login(client)
+        location = client.post("/jobs/generate", json=BODY, headers=auth).headers["location"]
+        res = client.get(location + "/events", headers=auth)
+        assert res.headers["content-type"].startswith("text/event-stream")
+        assert "content-encoding" not in res.headers
+        events = [line[len("event: "):] for line in res.text.splitlines() if line.startswith("event: ")]
+        assert events[-1] == "succeeded"
+        data = [json.loads(line[len("data: "):]) for line in res.text.splitlines() if line.startswith("data: ")]
+        assert data[-1]["result"] == {"success": True}
+
+
+def test_identical_requests_share_a_job():
+    async def run():
+        runner = JobRunner(MemoryJobStore(), workers=1)
+        release = asyncio.Event()
+
+        async def call() -> bytes:
+            await release.wait()
+            return b"1"
+        runner.start()
+        first = await runner.submit("key", 1, call)
+        assert await runner.submit("key", 1, call) is first
+        assert await runner.submit("other", 1, call) is not first
+        release.set()
+        await asyncio.sleep(0.01)
+        assert (await runner.get(first.id, 1)).status == "succeeded"
+        with pytest.raises(HTTPException):
+            await runner.get(first.id, 2)
+        # a finished job is not shared anymore
+        assert await runner.submit("key", 1, call) is not first
+        assert runner.stats()["deduplicated"] == 1
+        await runner.stop()
+    asyncio.run(run())
+
+
+def test_failures_and_full_queue():
+    async def run():
+        runner = JobRunner(workers=1, queue_size=1)
+
+        async def fail() -> bytes:
+            raise HTTPException(status_code=502, detail="Upstream unreachable")
+        job = await runner.submit("a", None, fail)
+        with pytest.raises(HTTPException) as e:
+            await runner.submit("b", None, fail)
+        assert e.value.status_code == 503
+        runner.start()
+        await asyncio.sleep(0.01)
+        job = await runner.get(job.id, None)
+        assert job.status == "failed"
+        assert json.loads(job.render())["error"] == {"status_code": 502, "detail": "Upstream unreachable"}
+        await runner.stop()
+    asyncio.run(run())
+
+
+def test_incomplete_store_is_rejected_when_created():
+    class WithoutActive(JobStore):
+        async def get(self, id: str):
+            return None
+
+        async def put(self, job):
+            pass
+
+    with pytest.raises(TypeError):
+        WithoutActive()
+
+
+def test_active_jobs_are_not_evicted():
+    async def run():
+        store = MemoryJobStore(max_jobs=2)
+        running = Job("slow", 1)
+        running.status = "running"
+        await store.put(running)
+        # more finished jobs than the store keeps
+        for i in range(5):
+            job = Job(f"quick{i}", 1)
+            job.status = "succeeded"
+            await store.put(job)
+        assert await store.get(running.id) is running
+        assert await store.active("slow") is running
+        running.status = "succeeded"
+        await store.put(running)
+        assert await store.get(running.id) is running
+        assert await store.active("slow") is None
+    asyncio.run(run())
+
+
+def test_queued_jobs_fail_on_stop():
+    async def run():
+        runner = JobRunner(workers=1)
+
+        async def forever() -> bytes:
+            await asyncio.Event().wait()
+            return b"1"
+        runner.start()
+        running = await runner.submit("a", None, forever)
+        queued = await runner.submit("b", None, forever)
+        await asyncio.sleep(0)
+        await runner.stop()
+        for job in (running, queued):
+            job = await runner.get(job.id, None)
+            assert job.status == "failed"
+            assert job.error == (503, "Gateway shutting down")
+        assert await runner.submit("b", None, forever) is not queued
+    asyncio.run(run())
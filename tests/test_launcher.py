@@ -0,0 +1,36 @@
+from apigateway import Launcher
+
+
+def test_defaults(monkeypatch):
+    for key in ("APP", "PORT", "WORKERS", "ACCESS_LOG"):
+        monkeypatch.delenv(f"GATEWAY_{key}", raising=False)
+    args = Launcher.parse_args([])
+    assert args.app == "app.server:app"
+    assert args.port == 7001
+    assert args.workers == 0
+    assert args.limit_concurrency is None
+    assert not args.no_access_log
+
+
+def test_environment_and_arguments(monkeypatch):
+    monkeypatch.setenv("GATEWAY_PORT", "8080")
+    monkeypatch.setenv("GATEWAY_WORKERS", "3")
+    monkeypatch.setenv("GATEWAY_ACCESS_LOG", "false")
+    args = Launcher.parse_args(["other:app", "--workers", "5"])
+    assert (args.app, args.port, args.workers, args.no_access_log) == ("other:app", 8080, 5, True)
+
+
+def test_main_runs_uvicorn(monkeypatch):
+    calls = []
+    monkeypatch.setattr(Launcher.uvicorn, "run", lambda app, **kwargs: calls.append((app, kwargs)))
+    monkeypatch.setattr(Launcher, "cpu_count", lambda: 6)
+    Launcher.main(["--port", "9000"])
+    app, kwargs = calls[0]
+    assert app == "app.server:app"
+    assert kwargs["workers"] == 6
+    assert kwargs["port"] == 9000
+    assert kwargs["lifespan"] == "on"
+
+
+def test_cpu_count():
+    assert Launcher.cpu_count() >= 1
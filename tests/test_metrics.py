@@ -0,0 +1,21 @@
+from .conftest import gateway, login
+
+
+def test_metrics_and_server_timing():
+    with gateway(METRICS="true", ADMIN_TOKEN="admin") as client:
+        auth = login(client)
+        res = client.get("/user", headers=auth)
+        assert res.status_code == 200
+        timing = res.headers["server-timing"]
+        assert "auth;dur=" in timing and 'upstream;desc="user"' in timing
+
+        assert client.get("/metrics").status_code == 401
+        res = client.get("/metrics", headers={"Authorization": "Bearer admin"})
+        assert res.status_code == 200
+        assert 'gateway_request_duration_seconds_count{method="GET",route="/user"} 1' in res.text
+        assert 'upstream_responses_total{service="user"' in res.text
+
+
+def test_admin_endpoints_hidden_without_token():
+    with gateway() as client:
+        assert client.get("/metrics", headers={"X-Admin-Token": "anything"}).status_code == 404
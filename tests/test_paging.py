@@ -0,0 +1,59 @@
+from fastapi import HTTPException
+import pytest
+
+from apigateway.Paging import NEXT_CURSOR, PageRequest, Pagination, decode_cursor, encode_cursor
+
+from .conftest import gateway, login
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(40)) == 40
+    # empty, not base64, and base64 of "x40"
+    for cursor in ("", "!!", "eDQw"):
+        with pytest.raises(HTTPException) as e:
+            decode_cursor(cursor)
+        assert e.value.status_code == 400
+
+
+def test_pages_of_a_list():
+    items = [{"id": i, "name": f"item {i}"} for i in range(5)]
+    page = PageRequest(Pagination(), 2, None, "id")
+    assert page.url("/items") == "/items"
+    data, cursor = page.apply(items)
+    assert data == [{"id": 0}, {"id": 1}]
+    data, cursor = PageRequest(Pagination(), 2, cursor, None).apply(items)
+    assert [item["id"] for item in data] == [2, 3]
+    data, cursor = PageRequest(Pagination(), 2, cursor, None).apply(items)
+    assert [item["id"] for item in data] == [4]
+    assert cursor is None
+
+
+def test_upstream_paging():
+    page = PageRequest(Pagination(upstream_limit="limit", upstream_offset="offset"), 10, encode_cursor(20), None)
+    assert page.url("/items?q=x") == "/items?q=x&limit=11&offset=20"
+    data, cursor = page.apply(list(range(11)))
+    assert data == list(range(10))
+    assert decode_cursor(cursor) == 30
+    assert PageRequest(Pagination(upstream_limit="top"), 10, encode_cursor(20), None).url("/items") == "/items?top=31"
+
+
+def test_paged_routes():
+    with gateway() as client:
+        auth = login(client)
+        res = client.get("/health/history", params={"limit": 2, "fields": "id,weight"}, headers=auth)
+        assert res.status_code == 200
+        assert res.json() == [{"id": 0, "weight": 80.0}, {"id": 1, "weight": 80.0}]
+        res = client.get("/health/history", params={"limit": 2, "cursor": res.headers[NEXT_CURSOR]}, headers=auth)
+        assert [entry["id"] for entry in res.json()] == [2]
+        assert NEXT_CURSOR not in res.headers
+
+        # without paging parameters the upstream list is passed on whole
+        assert len(client.get("/health/history", headers=auth).json()) == 3
+        assert client.get("/health/history", params={"cursor": "nope"}, headers=auth).status_code == 400
+        assert client.get("/health/history", params={"limit": 0}, headers=auth).status_code == 422
+
+
+def test_paged_inventories():
+    with gateway() as client:
+        res = client.get("/inventories", params={"limit": 1, "fields": "id,name"}, headers=login(client))
+        assert res.json() == [{"id": 1, "name": "fridge"}]
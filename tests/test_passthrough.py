@@ -0,0 +1,57 @@
+import httpx
+import pytest
+
+from apigateway import Service
+from apigateway.Concurrency import ConcurrencyLimit
+
+from .conftest import gateway, handler, json_response, login
+
+BODY = b'{"title": "soup",   "servings": 4}'
+
+
+def recipes(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/recipe/404":
+        return json_response(404, {"detail": "No such recipe"})
+    return httpx.Response(200, headers={"content-type": "application/json", "x-upstream": "recipe", "content-length": str(len(BODY)), "connection": "keep-alive"}, stream=httpx.ByteStream(BODY))
+
+
+def test_body_is_forwarded_untouched():
+    with gateway({"recipe": handler({"/recipe/1": recipes, "/recipe/404": recipes})}, COMPRESSION="false", CONDITIONAL="false") as client:
+        auth = login(client)
+        res = client.get("/recipe/1", headers=auth)
+        assert res.status_code == 200
+        assert res.content == BODY
+        assert res.headers["content-type"] == "application/json"
+        assert res.headers["x-upstream"] == "recipe"
+        assert res.headers["content-length"] == str(len(BODY))
+
+        res = client.get("/recipe/404", headers=auth)
+        assert res.status_code == 404
+        assert res.json() == {"detail": "No such recipe"}
+
+
+class Broken(httpx.AsyncByteStream):
+    # the upstream goes away after the first chunk
+    async def __aiter__(self):
+        yield BODY[:10]
+        raise httpx.ReadError("connection reset")
+
+
+@pytest.mark.parametrize("coalesce", [True, False])
+def test_upstream_failing_mid_body_releases_the_request(coalesce):
+    def broken(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "application/json"}, stream=Broken())
+    service = Service("http://recipe", transport=handler({"/recipe/1": broken, "/recipe/2": recipes}), name="recipe",
+                      coalesce=coalesce,
+                      concurrency=ConcurrencyLimit("recipe", initial=2, min_limit=2, max_limit=2, max_wait=0.1))
+    with gateway(services={"recipe": service}, COMPRESSION="false", CONDITIONAL="false") as client:
+        auth = login(client)
+        for _ in range(3):
+            with pytest.raises(httpx.ReadError):
+                client.get("/recipe/1", headers=auth)
+            stats = service.pool_stats()
+            assert stats["in_flight"] == 0
+            assert stats["concurrency"]["in_flight"] == 0
+            if coalesce:
+                assert service.resilience_stats()["coalescing"]["in_flight"] == 0
+        assert client.get("/recipe/2", headers=auth).content == BODY
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+
+import httpx
+
+from apigateway import Service
+from apigateway.Profiler import Sampler
+
+from .conftest import gateway, json_response
+
+
+def busy(seconds: float):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        sum(range(1000))
+
+
+def test_samples_the_target_thread():
+    sampler = Sampler(interval=0.001)
+    worker = threading.Thread(target=busy, args=(0.2,))
+    worker.start()
+    sampler.start(target=worker.ident)
+    worker.join()
+    sampler.stop()
+    stats = sampler.stats()
+    assert not stats["running"]
+    assert stats["samples"] > 10
+    lines = sampler.folded().splitlines()
+    stack, count = lines[0].rsplit(" ", 1)
+    assert "test_profiler:busy" in stack
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == stats["samples"]
+
+
+def test_stops_after_duration():
+    sampler = Sampler(interval=0.001)
+    sampler.start(duration=0.05)
+    time.sleep(0.2)
+    assert not sampler.running
+    assert sampler.stats()["seconds"] < 0.2
+
+
+def test_profiler_endpoints():
+    with gateway(ADMIN_TOKEN="admin") as client:
+        admin = {"X-Admin-Token": "admin"}
+        res = client.post("/profiler/start", params={"interval": 0.001, "duration": 5}, headers=admin)
+        assert res.json()["running"]
+        time.sleep(0.05)
+        assert not client.post("/profiler/stop", headers=admin).json()["running"]
+        res = client.get("/profiler", headers=admin)
+        assert res.headers["content-type"].startswith("text/plain")
+        assert client.post("/profiler/start").status_code == 401
+
+
+def test_service_warmup():
+    sent = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        sent.append((request.url.host, request.url.path))
+        return json_response(404, {})
+
+    async def run():
+        service = Service(["http://127.0.0.1:8001", "http://localhost:8002"], transport=httpx.MockTransport(handle))
+        await service.warmup(connections=2, path="/health")
+        await service.close()
+    asyncio.run(run())
+    assert sorted(sent) == [("127.0.0.1", "/health")] * 2 + [("localhost", "/health")] * 2
+
+
+def test_gateway_warmup():
+    with gateway(WARMUP="true") as client:
+        assert client.app.openapi_schema is not None
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from apigateway.RateLimit import MemoryStore, RateStore
+
+from .conftest import gateway, login
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket():
+    clock = Clock()
+    store = MemoryStore(clock=clock)
+
+    async def run():
+        waits = [await store.token_bucket("k", 2, 4) for _ in range(5)]
+        assert waits[:4] == [0.0] * 4
+        assert waits[4] == pytest.approx(0.5)
+        clock.now += 0.5
+        assert await store.token_bucket("k", 2, 4) == 0.0
+        assert await store.token_bucket("other", 2, 4) == 0.0
+    asyncio.run(run())
+
+
+def test_sliding_window():
+    clock = Clock()
+    store = MemoryStore(clock=clock)
+
+    async def run():
+        assert [await store.sliding_window("k", 3, 10) for _ in range(3)] == [0.0] * 3
+        assert await store.sliding_window("k", 3, 10) > 0
+        # the previous window still counts for the part of it that overlaps
+        clock.now += 10
+        assert await store.sliding_window("k", 3, 10) > 0
+        clock.now += 5
+        assert await store.sliding_window("k", 3, 10) == 0.0
+    asyncio.run(run())
+
+
+def foods(client, n: int) -> list[int]:
+    return [client.get("/foods", params={"query": "milk"}).status_code for _ in range(n)]
+
+
+def test_route_quota():
+    with gateway() as client:
+        statuses = foods(client, 25)
+        assert statuses.count(429) == 5
+        res = client.get("/foods", params={"query": "milk"})
+        assert res.status_code == 429
+        assert int(res.headers["Retry-After"]) >= 1
+
+
+def test_route_quota_override():
+    with gateway(RATE_LIMIT_GET_FOODS="2/60") as client:
+        assert foods(client, 3) == [200, 200, 429]
+    with gateway(RATE_LIMIT_GET_FOODS="off") as client:
+        assert set(foods(client, 30)) == {200}
+
+
+def test_default_quota():
+    with gateway(RATE_LIMIT="2/60", RATE_LIMIT_GET_USER="3/60") as client:
+        auth = login(client)
+        assert [client.get("/mealPlan/all", headers=auth).status_code for _ in range(3)] == [200, 200, 429]
+        assert [client.get("/user", headers=auth).status_code for _ in range(4)] == [200, 200, 200, 429]
+
+
+def test_rate_limit_off():
+    with gateway(RATE_LIMIT="off") as client:
+        assert set(foods(client, 30)) == {200}
+
+
+def test_incomplete_store_is_rejected_when_created():
+    class TokenBucketOnly(RateStore):
+        async def token_bucket(self, key: str, rate: float, burst: float) -> float:
+            return 0.0
+
+    with pytest.raises(TypeError):
+        TokenBucketOnly()
@@ -0,0 +1,157 @@
+import asyncio
+
+from fastapi import HTTPException
+import httpx
+import pytest
+
+from apigateway import Service
+from apigateway.Resilience import BreakerState, CircuitBreaker, RetryBudget, RetryPolicy
+
+from .conftest import json_response
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def service(respond, **kwargs) -> tuple[Service, list[httpx.Request]]:
+    sent = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        sent.append(request)
+        return respond(request)
+    kwargs.setdefault("retry", RetryPolicy(attempts=3, backoff=0))
+    return Service("http://upstream", transport=httpx.MockTransport(handle), name="upstream", coalesce=False, **kwargs), sent
+
+
+def fail(method: str, service: Service, path: str = "/items", data: str | None = None) -> HTTPException:
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(service.request(method, path, dict, data=data))
+    return e.value
+
+
+def test_breaker_transitions():
+    clock = Clock()
+    breaker = CircuitBreaker("upstream", failure_threshold=3, recovery_time=10, half_open_max=1, clock=clock)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state is BreakerState.CLOSED
+    breaker.record_success()
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state is BreakerState.OPEN
+    assert not breaker.allow()
+
+    clock.now += 10
+    assert breaker.state is BreakerState.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state is BreakerState.OPEN
+
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_cancelled()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state is BreakerState.CLOSED
+    assert breaker.stats()["transitions"] == 5
+
+
+def test_open_breaker_answers_503():
+    breaker = CircuitBreaker("upstream", failure_threshold=2, recovery_time=30)
+    upstream, sent = service(lambda request: json_response(500, {"detail": "boom"}), breaker=breaker)
+    assert fail("get", upstream).status_code == 500
+    assert fail("get", upstream).status_code == 500
+    e = fail("get", upstream)
+    assert e.status_code == 503
+    assert int(e.headers["Retry-After"]) > 0
+    assert len(sent) == 2
+
+
+def test_retries_idempotent_requests_only():
+    statuses = iter([503, 502, 200])
+    upstream, sent = service(lambda request: json_response(next(statuses), {"ok": True}))
+    assert asyncio.run(upstream.request("get", "/items", dict)) == {"ok": True}
+    assert len(sent) == 3
+
+    upstream, sent = service(lambda request: json_response(503, {"detail": "busy"}))
+    assert fail("post", upstream, data="{}").status_code == 503
+    assert len(sent) == 1
+    assert fail("put", upstream, data="{}").status_code == 503
+    assert len(sent) == 4
+
+
+def test_does_not_retry_other_errors():
+    upstream, sent = service(lambda request: json_response(500, {"detail": "boom"}))
+    assert fail("get", upstream).detail == "boom"
+    assert len(sent) == 1
+
+
+def test_retry_budget():
+    clock = Clock()
+    budget = RetryBudget(ratio=0.5, min_per_sec=1, clock=clock)
+    assert sum(budget.withdraw() for _ in range(20)) == 10
+    assert not budget.withdraw()
+    for _ in range(2):
+        budget.deposit()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    clock.now += 3
+    assert sum(budget.withdraw() for _ in range(5)) == 3
+    assert budget.stats()["exhausted"] == 14
+
+
+def test_exhausted_budget_stops_retries():
+    budget = RetryBudget(ratio=0, min_per_sec=0)
+    while budget.withdraw():
+        pass
+    upstream, sent = service(lambda request: json_response(503, {"detail": "busy"}), retry=RetryPolicy(attempts=3, backoff=0, budget=budget))
+    assert fail("get", upstream).status_code == 503
+    assert len(sent) == 1
+
+
+@pytest.mark.parametrize("error, status_code", [
+    (httpx.ConnectError("refused"), 502),
+    (httpx.RemoteProtocolError("closed"), 502),
+    (httpx.ReadTimeout("slow"), 504),
+    (httpx.ConnectTimeout("slow"), 504),
+])
+def test_transport_errors(error, status_code):
+    def respond(request):
+        raise error
+    upstream, sent = service(respond)
+    assert fail("get", upstream).status_code == status_code
+    assert len(sent) == 3
+    assert fail("post", upstream, data="{}").status_code == status_code
+    assert len(sent) == 4
+
+
+def test_total_timeout():
+    async def slow(request):
+        await asyncio.sleep(1)
+        return json_response(200, {})
+    upstream = Service("http://upstream", transport=httpx.MockTransport(slow), total_timeout=0.05)
+    assert fail("get", upstream).status_code == 504
+
+
+@pytest.mark.parametrize("content_type, body", [
+    ("text/html", b"<html><body><h1>503 Service Temporarily Unavailable</h1></body></html>"),
+    ("application/json", b'["busy"]'),
+    ("application/json", b""),
+])
+def test_error_bodies_that_are_not_objects(content_type, body):
+    upstream, _ = service(lambda request: httpx.Response(503, headers={"content-type": content_type}, content=body), retry=None)
+    e = fail("get", upstream)
+    assert e.status_code == 503
+    assert e.detail == "Service Unavailable"
+
+
+def test_error_detail():
+    upstream, _ = service(lambda request: json_response(404, {"title": "Not here"}))
+    e = fail("get", upstream)
+    assert (e.status_code, e.detail) == (404, "Not here")
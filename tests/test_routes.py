@@ -0,0 +1,39 @@
+from .conftest import gateway, handler, json_response, login
+
+
+def test_forwarded_json(client, auth):
+    res = client.get("/user", headers=auth)
+    assert res.status_code == 200
+    assert res.json()["username"] == "bench"
+
+
+def test_requires_token(client):
+    assert client.get("/user").status_code == 401
+    assert client.get("/user", headers={"Authorization": "Bearer nope"}).status_code == 401
+
+
+def test_success_routes():
+    users = handler({
+        "/validate": lambda request: json_response(200, {"success": True, "id": 1}),
+        "/user": lambda request: json_response(200, {"success": False}),
+    })
+    mealplans = handler({
+        "/generate": lambda request: json_response(200, {"success": False}),
+        "/mealPlan": lambda request: json_response(200, 7),
+    })
+    with gateway({"user": users, "mealplan": mealplans}) as client:
+        auth = login(client)
+        # "success" reports the field of the upstream response
+        res = client.post("/user", json={
+            "username": "bob", "email": "bob@example.com", "gender": "other", "birthday": "1970-01-01", "password": "pw",
+            "target_energy": {"calories": 2000, "fat": 60, "carbohydrates": 60, "protein": 60},
+        })
+        assert res.status_code == 201
+        assert res.json() == {"success": False}
+        # "ok" only acknowledges that the upstream accepted the request
+        res = client.post("/generate", json={"targets": [1.0], "split_days": [1.0]}, headers=auth)
+        assert res.status_code == 201
+        assert res.json() == {"success": True}
+        res = client.post("/meal", json={"startDate": "2023-12-11", "endDate": "2023-12-18"}, headers=auth)
+        assert res.status_code == 201
+        assert res.json() == {"success": True}
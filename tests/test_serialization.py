@@ -0,0 +1,47 @@
+import json
+
+from pydantic import ValidationError
+import pytest
+
+from apigateway import schema
+from apigateway.Serialization import ResponseAdapter, parser
+
+INVENTORY = {
+    "id": 1, "userId": 2, "name": "fridge", "owner": "not in the model",
+    "items": [{"id": 3, "foodId": 4, "expirationDate": "2024-01-01", "extra": True}],
+}
+
+
+def test_validated():
+    adapter = ResponseAdapter(schema.Inventory)
+    inventory = adapter.parse(json.dumps(INVENTORY).encode())
+    assert isinstance(inventory, schema.Inventory)
+    body = json.loads(adapter.render(inventory, 201).body)
+    assert body["items"][0]["timestamp"] == "2023-01-01"
+    assert "owner" not in body
+    with pytest.raises(ValidationError):
+        adapter.parse(b'{"id": 1}')
+
+
+def test_trusted_projects_onto_the_model():
+    adapter = ResponseAdapter(schema.Inventory, trusted=True)
+    inventory = adapter.parse(json.dumps(INVENTORY).encode())
+    assert inventory == {
+        "id": 1, "userId": 2, "name": "fridge",
+        "items": [{"id": 3, "foodId": 4, "expirationDate": "2024-01-01", "timestamp": "2023-01-01", "food": None}],
+    }
+    res = adapter.render(inventory, 201)
+    assert res.status_code == 201
+    assert json.loads(res.body) == inventory
+
+
+def test_trusted_and_validated_render_the_same():
+    content = json.dumps([INVENTORY, {**INVENTORY, "items": []}]).encode()
+    validated, trusted = ResponseAdapter(list[schema.Inventory]), ResponseAdapter(list[schema.Inventory], trusted=True)
+    assert json.loads(validated.render(validated.parse(content)).body) == json.loads(trusted.render(trusted.parse(content)).body)
+
+
+def test_parser():
+    assert parser(dict)(b'{"a": 1}') == {"a": 1}
+    assert parser(list)(b"[1, 2]") == [1, 2]
+    assert isinstance(parser(schema.Energy)(b'{"calories": 1, "fat": 2, "carbohydrates": 3, "protein": 4}'), schema.Energy)
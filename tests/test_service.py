@@ -0,0 +1,64 @@
+import asyncio
+import sys
+
+import httpx
+
+from apigateway import Service
+
+from .conftest import json_response
+
+
+def test_reuses_one_client(monkeypatch):
+    clients = []
+
+    class Client(httpx.AsyncClient):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            clients.append(self)
+    monkeypatch.setattr(httpx, "AsyncClient", Client)
+
+    async def run():
+        upstream = Service("http://upstream", transport=httpx.MockTransport(lambda request: json_response(200, {})), coalesce=False)
+        for _ in range(3):
+            await upstream.request("get", "/items", dict)
+        assert len(clients) == 1
+        assert upstream.pool_stats()["requests"] == 3
+        await upstream.close()
+        assert not upstream.pool_stats()["open"]
+        await upstream.request("get", "/items", dict)
+        assert upstream.pool_stats()["open"]
+        await upstream.close()
+    asyncio.run(run())
+    assert len(clients) == 2
+
+
+def test_max_per_host():
+    in_flight = peak = 0
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return json_response(200, {})
+
+    async def run():
+        upstream = Service("http://upstream", transport=httpx.MockTransport(handle), max_per_host=2, coalesce=False)
+        await asyncio.gather(*(upstream.request("get", f"/items/{i}", dict) for i in range(6)))
+        assert upstream.pool_stats()["in_flight"] == 0
+        await upstream.close()
+    asyncio.run(run())
+    assert peak == 2
+
+
+def test_http2_without_h2_falls_back_to_http1(monkeypatch, caplog):
+    monkeypatch.setitem(sys.modules, "h2", None)
+    service = Service("http://user", http2=True, name="user")
+    assert service.pool_stats()["http2"] is False
+    assert "pip install httpx[http2]" in caplog.text
+
+    async def run():
+        await service.open()
+        await service.close()
+    asyncio.run(run())